@@ -0,0 +1,97 @@
+'''
+Times attaching a folder of receipts to one transaction with files prepared one at
+a time and on a thread pool (Database.PREPARE_WORKERS), against simply reading the
+files, which is as fast as ingest can get
+
+With no --folder a sample folder is generated: mostly uncompressed scans (BMP,
+compressed on the way in) and some random bytes standing in for JPEG photos.
+
+Usage:
+    python benchmarks/attachment_ingest.py [--folder DIR] [--files 200] [--workers 1 4 8]
+'''
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from blob_codecs import sample_scan
+from core import Attachment, Database, Sql, Transaction
+
+
+def sample_folder(directory, files):
+    scan = sample_scan()
+    for i in range(files):
+        if i % 4 == 3:
+            data = b'\xff\xd8\xff\xe0' + os.urandom(random.randint(200, 1500) * 1024)
+            name = 'photo{:03d}.jpg'.format(i)
+        else:
+            # vary each scan so every file has its own blob
+            data = scan[:-16] + os.urandom(16)
+            name = 'scan{:03d}.bmp'.format(i)
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+
+
+def read_all(attachments):
+    for attachment in attachments:
+        with open(attachment.filepath, 'rb') as f:
+            while f.read(Database.CHUNK_SIZE):
+                pass
+
+
+def ingest(db_path, attachments, workers):
+    for path in (db_path, os.path.splitext(db_path)[0] + '.blobs'):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    Sql.close_all()
+    Database.db_path = db_path
+    Database.prepare_tables()
+    Database.PREPARE_WORKERS = workers
+    transaction = Transaction()
+    transaction.name = 'Receipts'
+    transaction.amount = 1
+    transaction.date = '01-01-2024'
+    transaction.attachments = [Attachment(filepath=attachment.filepath) for attachment in attachments]
+    start = time.perf_counter()
+    Database.add_transaction(transaction)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time attaching a folder of files to a transaction')
+    parser.add_argument('--folder', help='folder of sample attachments (generated if omitted)')
+    parser.add_argument('--files', type=int, default=200, help='the number of files to generate')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='PREPARE_WORKERS values to try')
+    args = parser.parse_args(argv)
+
+    random.seed(1)
+    scratch = tempfile.mkdtemp()
+    try:
+        folder = args.folder
+        if folder is None:
+            folder = os.path.join(scratch, 'receipts')
+            os.mkdir(folder)
+            sample_folder(folder, args.files)
+        attachments = Attachment.from_paths([folder])
+        total = sum(os.path.getsize(attachment.filepath) for attachment in attachments)
+        print('{} files, {:.1f} MB'.format(len(attachments), total / 1e6))
+        start = time.perf_counter()
+        read_all(attachments)
+        print('{:<24}{:>8.2f}s'.format('read only', time.perf_counter() - start))
+        for workers in args.workers:
+            elapsed = ingest(os.path.join(scratch, 'ingest.db'), attachments, workers)
+            print('{:<24}{:>8.2f}s'.format('{} worker(s)'.format(workers), elapsed))
+    finally:
+        Sql.close_all()
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+'''
+Measures compression ratio and encode/decode speed of each blob codec on a
+corpus of attachments, to choose blobcodecs.POLICY
+
+With no --corpus a sample corpus is generated: a CSV statement export, an HTML
+invoice, an uncompressed scan (BMP) and random bytes standing in for JPEG/PDF
+data, which is already compressed.
+
+Usage:
+    python benchmarks/blob_codecs.py [--corpus DIR] [--repeat 3]
+'''
+import argparse
+import io
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import blobcodecs
+import filetypes
+
+
+def sample_csv(rows=50000):
+    out = io.StringIO()
+    out.write('Date,Cardholder,Amount,Description\n')
+    shops = ['TESCO STORES', 'AMAZON MARKETPLACE', 'TFL TRAVEL CHARGE', 'PRET A MANGER', 'SHELL PETROL']
+    for i in range(rows):
+        out.write('{:02d}/{:02d}/2023,J SMITH,{}.{:02d},{} {}\n'.format(
+            i % 28 + 1, i % 12 + 1, random.randint(1, 300), random.randint(0, 99), random.choice(shops), i))
+    return out.getvalue().encode()
+
+
+def sample_html(items=2000):
+    rows = ''.join('<tr><td class="item">Item {}</td><td class="qty">{}</td><td class="price">&pound;{}.{:02d}</td></tr>\n'.format(
+        i, random.randint(1, 5), random.randint(1, 99), random.randint(0, 99)) for i in range(items))
+    return ('<html><head><style>td {{ padding: 4px; }}</style></head><body><h1>Invoice</h1>'
+            '<table>\n{}</table></body></html>'.format(rows)).encode()
+
+
+def sample_scan(width=1240, height=1754):
+    # an A4 page at 150 dpi: white paper with lines of dark specks where the text is
+    row_bytes = (width * 3 + 3) & ~3
+    white = b'\xff' * row_bytes
+    pixels = bytearray()
+    for y in range(height):
+        if y % 40 < 12 and 100 < y < height - 100:
+            row = bytearray(white)
+            for x in random.sample(range(100, width - 100), width // 6):
+                row[x * 3:x * 3 + 3] = b'\x20\x20\x20'
+            pixels += row
+        else:
+            pixels += white
+    header = b'BM' + struct.pack('<IHHI', 54 + len(pixels), 0, 0, 54)
+    info = struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, len(pixels), 5906, 5906, 0, 0)
+    return header + info + bytes(pixels)
+
+
+def sample_corpus():
+    return [
+        ('statement.csv', sample_csv()),
+        ('invoice.html', sample_html()),
+        ('scan.bmp', sample_scan()),
+        ('photo.jpg', b'\xff\xd8\xff\xe0' + os.urandom(2 * 1024 * 1024)),
+    ]
+
+
+def load_corpus(directory):
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                corpus.append((name, f.read()))
+    return corpus
+
+
+def chunks(data, size=1024 * 1024):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare blob codecs on a corpus of attachments')
+    parser.add_argument('--corpus', help='directory of sample attachments (generated if omitted)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the fastest is reported')
+    args = parser.parse_args(argv)
+
+    random.seed(1)
+    corpus = load_corpus(args.corpus) if args.corpus else sample_corpus()
+    print('codecs available: {}'.format(', '.join(blobcodecs.CODECS)))
+    print('{:<20}{:<26}{:>10}{:<8}{:>8}{:>14}{:>14}'.format(
+        'file', 'type (policy)', 'size', '', 'ratio', 'encode MB/s', 'decode MB/s'))
+    for name, data in corpus:
+        mime_type = filetypes.guess_mime_type(name, data[:filetypes.HEAD_SIZE])
+        label = '{} ({})'.format(mime_type, blobcodecs.choose_codec(mime_type) or 'raw')
+        for codec in blobcodecs.CODECS:
+            encode_time, compressed = best_time(lambda: b''.join(blobcodecs.compress_chunks(chunks(data), codec)), args.repeat)
+            decode_time, decoded = best_time(lambda: b''.join(blobcodecs.decompress_chunks(chunks(compressed), codec)), args.repeat)
+            assert decoded == data
+            megabytes = len(data) / 1e6
+            print('{:<20}{:<26}{:>10}{:<8}{:>8.3f}{:>14.1f}{:>14.1f}'.format(
+                name, label, filetypes.format_size(len(data)), ' ' + codec, len(compressed) / len(data),
+                megabytes / encode_time, megabytes / decode_time))
+            name = label = ''
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+'''
+Stress test for several copies of the programme sharing one database file
+
+Starts --writers processes, each adding --transactions transactions (every
+--attachment-every-th with a small attachment) one at a time through
+Database.add_transaction, and --readers processes paging, searching and reading
+attachments in a loop until the writers finish. Every process has its own
+connections, as separate instances of the programme would. Afterwards the
+database is checked: every transaction and attachment written must be there,
+blob reference counts must match and PRAGMA integrity_check must pass.
+
+Run it with --journal-mode delete to compare against the rollback journal, where
+readers wait for every commit.
+
+Usage:
+    python benchmarks/concurrent_access.py [--readers 4] [--writers 4] [--transactions 200]
+        [--attachment-every 5] [--journal-mode wal] [--db path/to/test.db]
+
+Exits with status 1 if any operation failed or the database does not check out.
+'''
+import argparse
+import collections
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from core import Attachment, Database, Sql, Transaction
+
+
+def percentile(values, fraction):
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def writer(db_path, number, transactions, attachment_every, scratch):
+    Database.db_path = db_path
+    errors = collections.Counter()
+    latencies = []
+    for i in range(transactions):
+        transaction = Transaction()
+        transaction.name = 'writer{}'.format(number)
+        transaction.amount = random.randint(1, 20000) / 100
+        transaction.date = '{:02d}-{:02d}-2024'.format(i % 28 + 1, i % 12 + 1)
+        transaction.notes = 'transaction {} of writer {}'.format(i, number)
+        if attachment_every and i % attachment_every == 0:
+            filepath = os.path.join(scratch, 'w{}-{}.txt'.format(number, i))
+            with open(filepath, 'wb') as f:
+                f.write(os.urandom(2048))
+            transaction.attachments = [Attachment(filepath=filepath)]
+        start = time.perf_counter()
+        try:
+            Database.add_transaction(transaction)
+        except Exception as error:
+            errors[str(error)] += 1
+        latencies.append(time.perf_counter() - start)
+    Sql.close_all()
+    return errors, latencies
+
+
+def reader(db_path, stop, results):
+    Database.db_path = db_path
+    errors = collections.Counter()
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            rows = Database.get_transaction_rows(after_id=random.randint(0, 500), limit=50)
+            Database.search('writer{}'.format(random.randint(0, 3)), limit=20)
+            Database.count_transactions_between('2024-01-01', '2024-12-31')
+            for row in rows[:5]:
+                for attachment in Database.get_attachments_for_transaction(row[0]):
+                    attachment.data
+        except Exception as error:
+            errors[str(error)] += 1
+        latencies.append(time.perf_counter() - start)
+    Sql.close_all()
+    results.put((errors, latencies))
+
+
+def check(db_path, expected_transactions, expected_attachments):
+    problems = []
+    with Sql(db_path) as cursor:
+        cursor.execute('SELECT COUNT(*) FROM transactions')
+        transactions = cursor.fetchone()[0]
+        cursor.execute('SELECT COUNT(*) FROM attachments')
+        attachments = cursor.fetchone()[0]
+        cursor.execute('''
+            SELECT COUNT(*) FROM filedata
+            WHERE refcount != (SELECT COUNT(*) FROM attachments WHERE attachments.hash = filedata.hash)
+            ''')
+        bad_refcounts = cursor.fetchone()[0]
+        cursor.execute('PRAGMA integrity_check')
+        integrity = cursor.fetchone()[0]
+    if transactions != expected_transactions:
+        problems.append('{} transactions, expected {}'.format(transactions, expected_transactions))
+    if attachments != expected_attachments:
+        problems.append('{} attachments, expected {}'.format(attachments, expected_attachments))
+    if bad_refcounts:
+        problems.append('{} blob(s) with the wrong refcount'.format(bad_refcounts))
+    if integrity != 'ok':
+        problems.append('integrity_check: ' + integrity)
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run concurrent readers and writers against one database')
+    parser.add_argument('--readers', type=int, default=4, help='reader processes')
+    parser.add_argument('--writers', type=int, default=4, help='writer processes')
+    parser.add_argument('--transactions', type=int, default=200, help='transactions added by each writer')
+    parser.add_argument('--attachment-every', type=int, default=5, help='attach a file to every n-th transaction, 0 for none')
+    parser.add_argument('--journal-mode', default='wal', help='journal mode to run with, e.g. wal or delete')
+    parser.add_argument('--db', help='database file to use (a new temporary one by default)')
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp()
+    try:
+        db_path = args.db or os.path.join(scratch, 'shared.db')
+        Database.db_path = db_path
+        Database.JOURNAL_MODE = args.journal_mode
+        Database.prepare_tables()
+        Sql.close_all()
+
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        results = context.Queue()
+        readers = [context.Process(target=reader, args=(db_path, stop, results)) for _ in range(args.readers)]
+        for process in readers:
+            process.start()
+        start = time.perf_counter()
+        with context.Pool(args.writers) as pool:
+            written = pool.starmap(writer, [(db_path, number, args.transactions, args.attachment_every, scratch)
+                                            for number in range(args.writers)])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        read = [results.get() for _ in readers]
+        for process in readers:
+            process.join()
+
+        failed = False
+        print('journal_mode {}, {} writer(s), {} reader(s), {:.2f}s'.format(
+            args.journal_mode, args.writers, args.readers, elapsed))
+        for label, outcomes in (('writes', written), ('reads', read)):
+            errors = sum((outcome[0] for outcome in outcomes), collections.Counter())
+            latencies = [latency for outcome in outcomes for latency in outcome[1]]
+            print('{:<8}{:>7} ok {:>5} failed   {:>7.1f}/s   p50 {:>6.1f} ms   p99 {:>7.1f} ms'.format(
+                label, len(latencies) - sum(errors.values()), sum(errors.values()), len(latencies) / elapsed,
+                percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000))
+            for message, count in errors.most_common():
+                print('    {} x {}'.format(count, message))
+            failed = failed or len(errors) > 0
+
+        expected_attachments = 0
+        if args.attachment_every:
+            expected_attachments = args.writers * len(range(0, args.transactions, args.attachment_every))
+        problems = check(db_path, args.writers * args.transactions, expected_attachments)
+        for problem in problems:
+            print('check failed: ' + problem)
+        if not problems:
+            print('database checks out')
+        Sql.close_all()
+        return 1 if failed or problems else 0
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+'''
+Measures how long the headless modules take to import, using python -X importtime,
+and fails if one of them pulls in the GUI or a slow optional library
+
+core, and the command line tools built on it, must not import PySimpleGUI or
+anything in SLOW_MODULES at import time; those are imported where they are used.
+Each module is imported in a fresh interpreter, after a first run that writes
+the bytecode cache, and the fastest of --repeat runs is reported. The slowest
+imports under it are listed so a regression can be traced to its cause.
+
+Usage:
+    python benchmarks/import_time.py [--modules core importer ...] [--repeat 5] [--budget 100] [--top 8]
+
+Exits with status 1 if a module imports something in SLOW_MODULES or takes
+longer than --budget milliseconds.
+'''
+import argparse
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+MODULES = ['core', 'importer', 'exporter', 'reports', 'blobstore', 'worker']
+
+# modules that only some operations need, which the headless modules must not import up front
+SLOW_MODULES = {'PySimpleGUI', 'tkinter', 'PIL', 'fitz', 'numpy', 'zstandard', 'subprocess', 'tempfile', 'mimetypes',
+                'concurrent'}
+
+
+def import_times(module):
+    '''
+    Imports module in a new interpreter and returns its -X importtime lines as (name, depth, self_us, cumulative_us)
+    '''
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=SRC, env=env, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure and check the import time of the headless modules')
+    parser.add_argument('--modules', nargs='+', default=MODULES, help='modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='imports per module, the fastest is reported')
+    parser.add_argument('--budget', type=float, default=100, help='the most milliseconds an import may take')
+    parser.add_argument('--top', type=int, default=8, help='the number of slowest imports to list')
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module in args.modules:
+        import_times(module)  # writes the bytecode cache
+        runs = [import_times(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda times: times[-1][3])
+        total_ms = best[-1][3] / 1000
+        slow = sorted({name.split('.')[0] for name, _, _, _ in best} & SLOW_MODULES)
+        status = 'ok'
+        if slow:
+            status = 'imports ' + ', '.join(slow)
+        elif total_ms > args.budget:
+            status = 'over the {:.0f} ms budget'.format(args.budget)
+        failed = failed or status != 'ok'
+        print('{:<12}{:>9.1f} ms   {}'.format(module, total_ms, status))
+        # the direct imports of the module, slowest first
+        children = [entry for entry in best[:-1] if entry[1] == 1]
+        for name, _, _, cumulative_us in sorted(children, key=lambda entry: -entry[3])[:args.top]:
+            print('    {:<28}{:>9.1f} ms'.format(name, cumulative_us / 1000))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+'''
+Measures Database.query_cache on the reads the GUI repeats: reloading the page of
+transactions, viewing a transaction's attachments, searching and counting
+
+The same sequence of reads runs with the cache turned off and on. With it on,
+the statements SQLite runs are traced to show that repeated reads only run
+PRAGMA data_version. A write from another process is then made to check that
+the next read sees it.
+
+Usage:
+    python benchmarks/query_cache.py [--transactions 20000] [--reads 5000]
+'''
+import argparse
+import collections
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from core import Database, Sql, Transaction
+
+
+def populate(count):
+    shops = ['TESCO STORES', 'AMAZON MARKETPLACE', 'TFL TRAVEL CHARGE', 'PRET A MANGER', 'SHELL PETROL']
+    transactions = []
+    for i in range(count):
+        transaction = Transaction()
+        transaction.name = '{} {}'.format(random.choice(shops), i)
+        transaction.amount = random.randint(1, 30000) / 100
+        transaction.date = '{:02d}-{:02d}-2024'.format(i % 28 + 1, i % 12 + 1)
+        transaction.notes = ''
+        transactions.append(transaction)
+    Database.add_transactions(transactions)
+
+
+def views(count):
+    # a user paging back and forth over a few screens and opening a handful of transactions
+    for _ in range(count):
+        choice = random.random()
+        if choice < 0.4:
+            Database.get_transaction_rows(random.choice([0, 50, 100]), 101)
+        elif choice < 0.7:
+            Database.get_attachments_for_transaction(random.randint(1, 20))
+        elif choice < 0.9:
+            Database.search(random.choice(['tesco', 'amazon', 'pret']), 100)
+        else:
+            Database.count_transactions_between('2024-01-01', '2024-06-30')
+
+
+def timed(count, enabled):
+    Database.query_cache.enabled = enabled
+    Database.query_cache.clear()
+    random.seed(2)
+    start = time.perf_counter()
+    views(count)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure the query cache on repeated reads')
+    parser.add_argument('--transactions', type=int, default=20000, help='transactions in the test database')
+    parser.add_argument('--reads', type=int, default=5000, help='reads in the sequence')
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp()
+    try:
+        Database.db_path = os.path.join(scratch, 'cache.db')
+        Database.JOURNAL_MODE = 'wal'
+        Database.prepare_tables()
+        random.seed(1)
+        populate(args.transactions)
+
+        uncached = timed(args.reads, False)
+        cached = timed(args.reads, True)
+        cache = Database.query_cache
+        print('{} reads: {:.3f}s uncached, {:.3f}s cached ({:.1f}x), {} hits, {} misses'.format(
+            args.reads, uncached, cached, uncached / cached, cache.hits, cache.misses))
+
+        statements = collections.Counter()
+        with Sql(Database.db_path) as cursor:
+            cursor.connection.set_trace_callback(lambda statement: statements.update([statement.split()[0].upper()]))
+        views(1000)
+        with Sql(Database.db_path) as cursor:
+            cursor.connection.set_trace_callback(None)
+        print('statements run by 1000 more reads: {}'.format(dict(statements)))
+
+        before = Database.count_transactions_between('2024-01-01', '2024-12-31')
+        subprocess.run([sys.executable, '-c', 'from core import Database; Database.db_path = {!r}; '
+                        'Database.delete_transaction(1)'.format(Database.db_path)], cwd=SRC, check=True)
+        after = Database.count_transactions_between('2024-01-01', '2024-12-31')
+        print('count before and after another process deleted a transaction: {} -> {}'.format(before, after))
+        Sql.close_all()
+        return 0 if after == before - 1 else 1
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+'''
+Compares the memory and time used to load transactions as Transaction objects
+(one __dict__ and attachments list per row, the amount converted straight away)
+and as TransactionRow objects (__slots__, amount converted when first read)
+
+Usage:
+    python benchmarks/transaction_rows.py [--rows 200000]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import money
+from core import Database, Sql, Transaction, TransactionRow
+
+
+def as_transactions(rows):
+    transactions = []
+    for row in rows:
+        transaction = Transaction()
+        transaction.id = row[0]
+        transaction.name = row[1]
+        transaction.amount = money.from_pence(row[2])
+        transaction.date = row[3]
+        transaction.notes = row[4]
+        transactions.append(transaction)
+    return transactions
+
+
+def as_rows(rows):
+    return list(map(TransactionRow, rows))
+
+
+def measure(build, rows, show):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = build(rows)
+    built = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # what the View Expenses listbox does with each row
+    start = time.perf_counter()
+    for transaction in objects[:show]:
+        str(transaction)
+    shown = time.perf_counter() - start
+    return built, size, shown
+
+
+def populate(count):
+    def generate():
+        for i in range(count):
+            transaction = Transaction()
+            transaction.name = 'person {}'.format(i % 50)
+            transaction.amount = Decimal(i % 10000) / 100
+            transaction.date = '{:02d}-{:02d}-2022'.format(i % 28 + 1, i % 12 + 1)
+            transaction.notes = 'shop {}'.format(i)
+            yield transaction
+    Database.add_transactions(generate())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--show', type=int, default=25, help='rows formatted for display after loading')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        Database.db_path = os.path.join(directory, 'benchmark.db')
+        Database.prepare_tables()
+        populate(args.rows)
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('SELECT id, name, amount, date, notes FROM transactions')
+            rows = cursor.fetchall()
+        Sql.close_all()
+
+    print('{:,} transactions'.format(len(rows)))
+    print('{:<16}{:>12}{:>14}{:>16}'.format('', 'build (s)', 'memory (MB)', 'show {} (ms)'.format(args.show)))
+    for label, build in (('Transaction', as_transactions), ('TransactionRow', as_rows)):
+        built, size, shown = measure(build, rows, args.show)
+        print('{:<16}{:>12.3f}{:>14.1f}{:>16.3f}'.format(label, built, size / 1e6, shown * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+'''
+Columnar spending analytics backed by NumPy
+
+TransactionFrame loads the id, date, amount and name of every transaction into
+NumPy arrays in a single pass over the table, after which totals, group-bys,
+percentiles and rolling windows are vectorised and do not touch the database or
+build Transaction objects. NumPy is only needed by this module.
+'''
+from core import Database, Sql
+
+try:
+    import numpy as np
+except ImportError:  # analytics are optional, the rest of the programme does not need NumPy
+    np = None
+
+
+class TransactionFrame:
+    """
+    Column arrays for a set of transactions
+
+    Attributes
+    ----------
+    ids : numpy.ndarray[int64]
+        transaction ids
+
+    days : numpy.ndarray[datetime64[D]]
+        transaction dates, NaT where the date could not be parsed
+
+    amounts : numpy.ndarray[int64]
+        amounts in pence (missing amounts are 0)
+
+    name_codes : numpy.ndarray[int32]
+        index into names for each transaction
+
+    names : list[str]
+        the distinct names, in order of first appearance
+
+    Methods
+    -------
+    load : TransactionFrame
+        reads the transactions table, optionally limited to a date range
+
+    select : TransactionFrame
+        the rows matching a boolean mask
+
+    total, totals_by_name, totals_by_month, percentile, rolling_daily_totals
+        vectorised aggregates, all in pence
+
+    """
+    def __init__(self, ids, days, amounts, name_codes, names):
+        self.ids = ids
+        self.days = days
+        self.amounts = amounts
+        self.name_codes = name_codes
+        self.names = names
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def load(start_date=None, end_date=None, batch_size=100000):
+        '''
+        Loads transactions into column arrays with one query
+
+        Parameters:
+            start_date (str) : optional, earliest date to include, YYYY-MM-DD
+            end_date (str) : optional, latest date to include, YYYY-MM-DD
+            batch_size (int) : the number of rows converted to arrays at a time
+
+        Returns:
+            frame (TransactionFrame) : the loaded columns
+        '''
+        if np is None:
+            raise ImportError('TransactionFrame needs NumPy (pip install numpy)')
+        # dates that are not real, e.g. from a database older than migration 12, load as NaT
+        # instead of making NumPy reject the whole batch
+        query = '''
+            SELECT id, CASE WHEN date(iso_date, '+0 days') = iso_date THEN iso_date END,
+                COALESCE(amount, 0), COALESCE(name, '')
+            FROM transactions'''
+        parameters = []
+        if start_date is not None or end_date is not None:
+            query += ' WHERE iso_date BETWEEN ? AND ?'
+            parameters = [start_date or '0000-00-00', end_date or '9999-99-99']
+        codes = {}
+        id_chunks, day_chunks, amount_chunks, code_chunks = [], [], [], []
+        with Sql.get_pool(Database.db_path).borrow() as conn:
+            cursor = conn.execute(query, parameters)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if len(rows) == 0:
+                    break
+                ids, iso_dates, amounts, names = zip(*rows)
+                id_chunks.append(np.array(ids, dtype=np.int64))
+                day_chunks.append(np.array(iso_dates, dtype='datetime64[D]'))
+                amount_chunks.append(np.array(amounts, dtype=np.int64))
+                code_chunks.append(np.fromiter((codes.setdefault(name, len(codes)) for name in names),
+                                               dtype=np.int32, count=len(names)))
+            cursor.close()
+        if len(id_chunks) == 0:
+            return TransactionFrame(np.empty(0, np.int64), np.empty(0, 'datetime64[D]'),
+                                    np.empty(0, np.int64), np.empty(0, np.int32), [])
+        return TransactionFrame(np.concatenate(id_chunks), np.concatenate(day_chunks),
+                                np.concatenate(amount_chunks), np.concatenate(code_chunks), list(codes))
+
+    def select(self, mask):
+        '''
+        Returns a frame holding only the rows where mask is True, e.g.
+        frame.select(frame.days >= np.datetime64('2023-01-01'))
+        '''
+        return TransactionFrame(self.ids[mask], self.days[mask], self.amounts[mask], self.name_codes[mask], self.names)
+
+    def total(self):
+        '''
+        Returns the sum of all amounts in pence
+        '''
+        return int(self.amounts.sum())
+
+    def _sum_by(self, keys, size, amounts=None):
+        # bincount sums in float64, which is exact for totals below 2**53 pence
+        amounts = self.amounts if amounts is None else amounts
+        return np.rint(np.bincount(keys, weights=amounts, minlength=size)).astype(np.int64)
+
+    def totals_by_name(self):
+        '''
+        Returns a dict of name -> total pence for the names present in the frame
+        '''
+        totals = self._sum_by(self.name_codes, len(self.names))
+        present = np.bincount(self.name_codes, minlength=len(self.names)) > 0
+        return {name: int(total) for name, total, used in zip(self.names, totals, present) if used}
+
+    def totals_by_month(self, by_name=False):
+        '''
+        Totals per calendar month (rows without a date are left out)
+
+        Parameters:
+            by_name (bool) : split each month by name
+
+        Returns:
+            totals (dict) : YYYY-MM -> pence, or (YYYY-MM, name) -> pence when by_name is True
+        '''
+        dated = ~np.isnat(self.days)
+        if not dated.any():
+            return {}
+        months = self.days[dated].astype('datetime64[M]').astype(np.int64)
+        first_month = months.min()
+        width = len(self.names) if by_name else 1
+        keys = (months - first_month) * width
+        if by_name:
+            keys += self.name_codes[dated]
+        size = int(keys.max()) + 1
+        totals = self._sum_by(keys, size, self.amounts[dated])
+        present = np.flatnonzero(np.bincount(keys, minlength=size))
+        result = {}
+        for key, total in zip(present.tolist(), totals[present].tolist()):
+            month, code = divmod(key, width)
+            month = str(np.datetime64(int(first_month) + month, 'M'))
+            result[(month, self.names[code]) if by_name else month] = total
+        return result
+
+    def percentile(self, q):
+        '''
+        Returns the q-th percentile (0-100) of the amounts in pence
+        '''
+        if len(self) == 0:
+            return None
+        return float(np.percentile(self.amounts, q))
+
+    def rolling_daily_totals(self, window_days):
+        '''
+        Totals over a sliding window of window_days days, for every day from the first
+        to the last dated transaction
+
+        Returns:
+            (days, totals) (tuple[numpy.ndarray, numpy.ndarray]) : each day and the total
+                in pence of the window_days days ending on it
+        '''
+        dated = ~np.isnat(self.days)
+        if not dated.any():
+            return np.empty(0, 'datetime64[D]'), np.empty(0, np.int64)
+        days = self.days[dated]
+        first = days.min()
+        offsets = (days - first).astype(np.int64)
+        daily = self._sum_by(offsets, int(offsets.max()) + 1, self.amounts[dated])
+        running = np.concatenate(([0], np.cumsum(daily)))
+        starts = np.maximum(np.arange(1, len(daily) + 1) - window_days, 0)
+        totals = running[1:] - running[starts]
+        return first + np.arange(len(daily)), totals
@@ -0,0 +1,119 @@
+'''
+Compression of attachment blobs
+
+Each filedata row records the codec its data was written with (filedata.codec,
+NULL for raw bytes). Which codec a new file gets depends on its MIME type
+(POLICY): text, HTML and uncompressed scans shrink a lot, while JPEG, PNG, PDF
+and similar formats are already compressed and are stored as they are.
+Compression and decompression work on chunks, so memory use does not depend on
+the size of the file. zstd is used where the policy asks for it only if the
+zstandard package is installed, otherwise zlib; the package itself is imported
+the first time a zstd blob is written or read, as it takes ~10 ms to import.
+
+benchmarks/blob_codecs.py measures ratio and speed of each codec on a sample
+corpus, which is what POLICY is based on.
+'''
+import lzma
+import zlib
+from importlib.util import find_spec
+
+# zstd is optional
+HAVE_ZSTD = find_spec('zstandard') is not None
+
+ZLIB_LEVEL = 6
+LZMA_PRESET = 6
+ZSTD_LEVEL = 9
+
+# a compressed copy is only kept if it is at most this fraction of the original
+MAX_RATIO = 0.9
+
+
+def _zstd_compressor():
+    import zstandard
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+
+def _zstd_decompressor():
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+# codec name -> (make a compressor, make a decompressor); both have the zlib object interface
+CODECS = {
+    'zlib': (lambda: zlib.compressobj(ZLIB_LEVEL), zlib.decompressobj),
+    'lzma': (lambda: lzma.LZMACompressor(preset=LZMA_PRESET), lzma.LZMADecompressor),
+}
+if HAVE_ZSTD:
+    CODECS['zstd'] = (_zstd_compressor, _zstd_decompressor)
+
+# MIME type (or major type followed by /) -> preferred codec; anything not listed is stored raw.
+# lzma compresses text and scans 20-30% smaller than zlib but encodes 10-40x slower,
+# which is not worth it for receipts, so it is only kept for reading and experiments.
+POLICY = {
+    'text/': 'zstd',
+    'application/json': 'zstd',
+    'application/xml': 'zstd',
+    'image/tiff': 'zstd',
+    'image/bmp': 'zstd',
+    'application/octet-stream': 'zlib',
+}
+
+# formats that are compressed already, listed so that POLICY entries for a major type do not catch them
+ALREADY_COMPRESSED = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'application/pdf', 'application/zip',
+    'application/gzip', 'application/x-7z-compressed',
+}
+
+
+def choose_codec(mime_type):
+    '''
+    Returns the codec a file of this MIME type should be stored with, or None to store it raw
+    '''
+    if mime_type is None or mime_type in ALREADY_COMPRESSED:
+        return None
+    codec = POLICY.get(mime_type) or POLICY.get(mime_type.split('/')[0] + '/')
+    if codec is not None and codec not in CODECS:
+        codec = 'zlib'
+    return codec
+
+
+def compress_chunks(chunks, codec):
+    '''
+    Yields the compressed form of a sequence of byte strings
+    '''
+    compressor = CODECS[codec][0]()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def decompress_chunks(chunks, codec):
+    '''
+    Yields the original bytes of a sequence of compressed byte strings
+
+    Raises:
+        ValueError : if codec is not one this programme can read
+    '''
+    if codec is None:
+        yield from chunks
+        return
+    if codec not in CODECS:
+        raise ValueError('Attachment data is compressed with {}, which is not available'.format(codec))
+    decompressor = CODECS[codec][1]()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    if hasattr(decompressor, 'flush'):
+        yield decompressor.flush()
+
+
+def decompress(data, codec):
+    '''
+    Returns the original bytes of data compressed with codec (data itself if codec is None)
+    '''
+    if codec is None or data is None:
+        return data
+    return b''.join(decompress_chunks([data], codec))
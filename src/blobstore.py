@@ -0,0 +1,106 @@
+'''
+Moves attachment blobs between the database and the blob store
+
+Blobs at least Database.EXTERNAL_THRESHOLD bytes are written to a directory beside
+the database (expenses.blobs for expenses.db) instead of filedata.data. This tool
+applies a threshold to blobs that are already stored, or moves every blob to one
+tier. Each blob is moved in its own transaction, so the tool can be stopped and
+run again at any point. Space freed inside the database is returned to the
+filesystem afterwards with an incremental vacuum.
+
+Usage:
+    python blobstore.py [--threshold BYTES | --all-external | --all-inline] [--enable-incremental-vacuum]
+        [--db path/to/expenses.db]
+
+Databases created by older versions of the programme need one full VACUUM
+(--enable-incremental-vacuum) before space can be returned this way.
+'''
+import argparse
+import logging
+import os
+import time
+
+from core import Database, Sql
+
+logger = logging.getLogger(__name__)
+
+
+def rebalance(threshold=None, to=None, batch_size=500, progress=None):
+    '''
+    Moves blobs to the tier their stored size puts them in
+
+    Parameters:
+        threshold (int) : blobs this size or larger go to the blob store, Database.EXTERNAL_THRESHOLD if None
+        to (str) : 'external' or 'inline' to move every blob there regardless of size
+        batch_size (int) : the number of filedata rows read at a time
+        progress (callable) : optional, called as progress(rows_checked, blobs_moved) after each batch
+
+    Returns:
+        (external, inline) (tuple[int, int]) : the number of blobs moved to the store and into the database
+    '''
+    moved = {True: 0, False: 0}
+    checked = 0
+    last_id = 0
+    while True:
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT id, hash, external, length(data) FROM filedata
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+        if len(rows) == 0:
+            break
+        last_id = rows[-1][0]
+        for row_id, digest, external, size in rows:
+            if digest is None:
+                continue
+            if to is not None:
+                target = to == 'external'
+            else:
+                if external:
+                    try:
+                        size = os.path.getsize(Database.blob_store_path(digest))
+                    except OSError:
+                        logger.warning('Blob store file for %s is missing', digest)
+                        continue
+                target = Database.is_external_size(size or 0, threshold)
+            if Database.move_blob(row_id, target):
+                moved[target] += 1
+        checked += len(rows)
+        if progress is not None:
+            progress(checked, moved[True] + moved[False])
+    return moved[True], moved[False]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Move attachment blobs between the database and the blob store')
+    tier = parser.add_mutually_exclusive_group()
+    tier.add_argument('--threshold', type=int, help='blobs this many bytes or larger go to the blob store')
+    tier.add_argument('--all-external', dest='to', action='store_const', const='external', help='move every blob to the blob store')
+    tier.add_argument('--all-inline', dest='to', action='store_const', const='inline', help='move every blob into the database')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='rebuild a database created by an older version with one full VACUUM, so space can be returned from now on')
+    parser.add_argument('--db', help='database file (defaults to the one in config.ini)')
+    args = parser.parse_args(argv)
+
+    config = Database.configure(args.db)
+    threshold = args.threshold
+    if threshold is None:
+        threshold = config.getint('ATTACHMENTS', 'external_threshold', fallback=Database.EXTERNAL_THRESHOLD)
+    Database.EXTERNAL_THRESHOLD = threshold or None
+    Database.prepare_tables()
+    start = time.perf_counter()
+    external, inline = rebalance(to=args.to)
+    deleted, freed = Database.compact()
+    if args.enable_incremental_vacuum:
+        freed += Database.enable_incremental_vacuum()
+    elif not Database.incremental_vacuum_enabled():
+        print('This database cannot return free space to the filesystem; run once with --enable-incremental-vacuum')
+    print('Moved {} blob(s) to {} and {} into the database in {:.2f}s, freed {} page(s)'.format(
+        external, Database.blob_store_dir(), inline, time.perf_counter() - start, freed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2384 @@
+'''
+The storage and domain layer: the database, transactions and attachments
+
+Nothing here imports PySimpleGUI, so scripts and tools that only need the data
+(importer, exporter, reports, blobstore, benchmarks) start in milliseconds. The
+windows are in classes, which re-exports these names for the GUI. Modules that
+are slow to import and only needed by some operations are imported where they
+are used; benchmarks/import_time.py checks that this stays so.
+'''
+import sqlite3 as sql
+from abc import ABC, abstractmethod
+import os
+import re
+import hashlib
+import logging
+import threading
+import itertools
+import collections
+import functools
+import mmap
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+import migrations
+from datetime import datetime, timezone
+import blobcodecs
+import dates
+import filetypes
+import money
+import thumbnails
+
+logger = logging.getLogger(__name__)
+
+class FileOperations(ABC):
+    '''
+    Temporary files used to open attachments outside the programme
+
+    Extracted attachments are cached in temp_dir keyed by content hash, so opening
+    the same receipt again reuses the file on disk. The cache holds at most
+    cache_limit bytes; the least recently opened files are deleted first. temp_dir
+    is only created when the first attachment is opened.
+    '''
+    
+    temp_dir = None
+    cache_limit = 256 * 1024 * 1024
+    _extracted = OrderedDict()
+    _extracted_bytes = 0
+    _lock = threading.Lock()
+    
+
+    @abstractmethod
+    def delete_temp_dir():
+        with FileOperations._lock:
+            FileOperations._extracted.clear()
+            FileOperations._extracted_bytes = 0
+            temp_dir, FileOperations.temp_dir = FileOperations.temp_dir, None
+        if temp_dir is not None:
+            import shutil
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    @staticmethod
+    def get_temp_dir():
+        '''
+        Returns temp_dir, creating it the first time
+        '''
+        with FileOperations._lock:
+            if FileOperations.temp_dir is None:
+                import tempfile
+                FileOperations.temp_dir = tempfile.mkdtemp()
+            return FileOperations.temp_dir
+
+    @abstractmethod
+    def generate_filename():
+        for i in itertools.count(1):
+            yield "temp" + str(i)
+
+    filename = generate_filename()
+
+    @staticmethod
+    def extract_attachment(attachment):
+        '''
+        Returns the path of a file on disk holding an attachment's contents
+
+        The blob is streamed to temp_dir the first time; later calls for the same
+        content return the cached file without touching the database.
+
+        Parameters:
+            attachment (Attachment) : the attachment to extract
+
+        Returns:
+            filepath (str) : the path of the extracted file
+        '''
+        key = attachment.hash or 'attachment' + str(attachment.id)
+        with FileOperations._lock:
+            entry = FileOperations._extracted.get(key)
+            if entry is not None and os.path.exists(entry[0]):
+                FileOperations._extracted.move_to_end(key)
+                return entry[0]
+        temp_dir = FileOperations.get_temp_dir()
+        os.makedirs(temp_dir, exist_ok=True)
+        filepath = os.path.join(temp_dir, key)
+        if attachment.filetype:
+            filepath = filepath + '.' + attachment.filetype
+        size = Database.extract_file(attachment.id, filepath)
+        with FileOperations._lock:
+            previous = FileOperations._extracted.pop(key, None)
+            if previous is not None:
+                FileOperations._extracted_bytes -= previous[1]
+            FileOperations._extracted[key] = (filepath, size)
+            FileOperations._extracted_bytes += size
+            FileOperations._evict()
+        return filepath
+
+    @staticmethod
+    def open_file(filepath):
+        '''
+        Opens a file in the program the operating system associates with it
+        '''
+        import platform, subprocess
+        if platform.system() == 'Windows':
+            os.startfile(filepath)
+        elif platform.system() == 'Darwin':
+            subprocess.Popen(['open', filepath])
+        else:
+            subprocess.Popen(['xdg-open', filepath])
+
+    @staticmethod
+    def _evict():
+        # always keep the most recent file, it is about to be opened
+        while FileOperations._extracted_bytes > FileOperations.cache_limit and len(FileOperations._extracted) > 1:
+            _, (filepath, size) = FileOperations._extracted.popitem(last=False)
+            FileOperations._extracted_bytes -= size
+            try:
+                os.remove(filepath)
+            except OSError:
+                # still open in another programme; delete_temp_dir removes it on exit
+                pass
+
+class WriteQueue:
+    """
+    Lets the threads of one process write to a database one at a time, in the order they ask
+
+    SQLite allows a single writer per database file. Queueing writers here means
+    threads never compete for the file's write lock, so only writers in other
+    processes can find it held (see ConnectionPool.begin_write).
+
+    Methods
+    -------
+    acquire : None
+        waits until every writer queued before the caller has finished
+
+    release : None
+        hands the turn to the next writer in the queue
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiting = collections.deque()
+        self._busy = False
+
+    def acquire(self):
+        with self._lock:
+            if not self._busy:
+                self._busy = True
+                return
+            turn = threading.Event()
+            self._waiting.append(turn)
+        turn.wait()
+
+    def release(self):
+        with self._lock:
+            if self._waiting:
+                # the turn passes straight to the next writer, _busy stays True
+                self._waiting.popleft().set()
+            else:
+                self._busy = False
+
+
+class PooledConnection(sql.Connection):
+    '''
+    A connection opened by ConnectionPool, which can carry the state kept for it
+    '''
+    data_version = None  # PRAGMA data_version when QueryCache last checked this connection
+
+
+class ConnectionPool:
+    """
+    Long-lived SQLite connections for a single database file
+
+    Every thread gets its own connection the first time it enters an Sql block.
+    The main thread keeps its connection for the life of the pool; other threads
+    hand theirs back to a small idle pool when their outermost Sql block exits,
+    so short-lived worker threads reuse connections instead of reopening the file.
+
+    Several instances of the programme may share a database file. Connections wait
+    up to BUSY_TIMEOUT seconds for a lock held by another process, and write
+    transactions (Sql blocks opened with write=True) are queued in this process by
+    a WriteQueue and then started with BEGIN IMMEDIATE, retrying with backoff for up
+    to WRITE_TIMEOUT seconds. Taking the write lock before reading anything avoids
+    the "database is locked" error SQLite raises at once, without waiting, when a
+    transaction that has already read tries to write after another connection
+    has committed. With the WAL journal (see Database.set_journal_mode) readers
+    never wait for the writer.
+
+    Attributes
+    ----------
+    db_path : str
+        The path to the database file
+
+    max_idle : int
+        The maximum number of idle worker connections kept open
+
+    writers : WriteQueue
+        The queue write transactions in this process wait in
+
+    generation : int
+        Goes up by one after every commit through the pool that changed rows (see QueryCache)
+
+    Methods
+    --------
+    acquire : sqlite3.connection
+        returns the calling thread's connection, opening or reusing one if needed
+
+    begin_write : None
+        starts a write transaction, waiting for the write lock with backoff
+
+    run_locked : object
+        runs a statement that needs the write lock outside a transaction, with the same queue and backoff
+
+    data_version : int
+        a number that changes whenever anyone commits to the database
+
+    last_write : tuple
+        what data_version was just before and just after the calling thread's last write committed
+
+    release : None
+        ends one level of Sql nesting, committing (or rolling back) at the outermost level
+
+    borrow : sqlite3.connection
+        context manager lending a connection that is not tied to the calling thread
+
+    close : None
+        closes every connection owned by the pool
+
+    """
+    STATEMENT_CACHE_SIZE = 256
+    BUSY_TIMEOUT = 5.0  # seconds a statement waits for a lock held by another connection
+    WRITE_TIMEOUT = 60.0  # seconds begin_write keeps retrying before giving up
+    RETRY_DELAY = 0.05  # first pause between begin_write attempts, doubled after each one
+    MAX_RETRY_DELAY = 1.0
+    CACHE_SIZE = 16 * 1024 * 1024  # page cache per connection, in bytes
+    MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database file read through a memory map, 0 to turn off
+
+    def __init__(self, db_path, max_idle=4):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.writers = WriteQueue()
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._idle = []
+        self._pinned = []
+        self._watcher = None
+
+    def _connect(self):
+        conn = sql.connect(self.db_path, timeout=ConnectionPool.BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=ConnectionPool.STATEMENT_CACHE_SIZE, factory=PooledConnection)
+        conn.execute('PRAGMA foreign_keys = ON')
+        # a negative cache_size is in KiB rather than pages
+        conn.execute('PRAGMA cache_size = {}'.format(-(ConnectionPool.CACHE_SIZE // 1024)))
+        conn.execute('PRAGMA mmap_size = {}'.format(int(ConnectionPool.MMAP_SIZE)))
+        # with WAL, NORMAL skips the sync on each commit: a power cut can lose the last
+        # commits but cannot corrupt the database
+        if conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            conn.execute('PRAGMA synchronous = NORMAL')
+        logger.debug("Connected to database %s", self.db_path)
+        return conn
+
+    def acquire(self, write=False):
+        '''
+        Returns the connection for the calling thread
+
+        Parameters:
+            write (bool) : if True, make sure the thread is in a write transaction (see begin_write)
+
+        Returns:
+            conn (sqlite3.connection) : the thread's connection to the database
+        '''
+        local = self._local
+        if getattr(local, 'conn', None) is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._connect()
+            local.conn = conn
+            local.depth = 0
+            local.writing = False
+            if threading.current_thread() is threading.main_thread():
+                with self._lock:
+                    self._pinned.append(conn)
+        if local.depth == 0:
+            local.changes = local.conn.total_changes
+        local.depth += 1
+        if write and not local.writing:
+            try:
+                self.begin_write(local.conn)
+            except BaseException:
+                self.release(commit=False)
+                raise
+        return local.conn
+
+    def begin_write(self, conn):
+        '''
+        Waits for this process's writers queued ahead, then starts a write transaction on conn
+
+        BEGIN IMMEDIATE takes the database's write lock at once. While another
+        process holds it, each attempt waits BUSY_TIMEOUT seconds inside SQLite and
+        is then retried after a pause that doubles (with jitter, so processes
+        waiting together do not retry in step) until WRITE_TIMEOUT has passed.
+        If the connection is already in a transaction it is used as it is.
+
+        Parameters:
+            conn (sqlite3.connection) : the calling thread's connection
+
+        Raises:
+            sqlite3.OperationalError : if the write lock could not be taken within WRITE_TIMEOUT
+        '''
+        self.writers.acquire()
+        self._local.writing = True
+        if conn.in_transaction:
+            return
+        self._retry_busy(lambda: conn.execute('BEGIN IMMEDIATE'))
+
+    def data_version(self):
+        '''
+        Returns a number that changes whenever any connection, in this process or another, commits
+
+        PRAGMA data_version only moves for commits made by other connections, and the
+        threads here use several, so the pool asks a connection of its own that never
+        writes.
+        '''
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = self._connect()
+            return self._watcher.execute('PRAGMA data_version').fetchone()[0]
+
+    def last_write(self):
+        '''
+        Returns (before, after) for the calling thread's last committed write block
+
+        before is data_version just before the commit, when the write lock kept
+        everyone else from committing, and after is data_version once it was done.
+        after is None if another connection also committed in between, so a caller
+        holding data that was current at before can apply the write itself and be
+        current at after (see TransactionPager.apply_insert).
+        '''
+        return getattr(self._local, 'last_write', None)
+
+    def _commit_write(self, conn):
+        # the connection's own data_version ignores its commits, so if it has not moved
+        # by the time after has been read, nothing else was committed since before
+        self._local.last_write = None
+        before = self.data_version()
+        own = conn.execute('PRAGMA data_version').fetchone()[0]
+        self._retry_busy(conn.commit)
+        after = self.data_version()
+        if conn.execute('PRAGMA data_version').fetchone()[0] != own:
+            after = None
+        self._local.last_write = (before, after)
+
+    def run_locked(self, statement):
+        '''
+        Runs a statement that takes the write lock outside a transaction, such as
+        PRAGMA journal_mode or VACUUM, in turn with this process's writers
+
+        Like BEGIN IMMEDIATE in begin_write, it is retried with backoff while
+        another process holds the lock. Must not be called inside a write block.
+
+        Parameters:
+            statement (callable) : runs the statement and returns its result
+
+        Returns:
+            result : what statement returned
+        '''
+        self.writers.acquire()
+        try:
+            return self._retry_busy(statement)
+        finally:
+            self.writers.release()
+
+    def _retry_busy(self, statement):
+        # runs statement, retrying with the backoff described in begin_write while the database is locked
+        import random
+        deadline = time.monotonic() + ConnectionPool.WRITE_TIMEOUT
+        delay = ConnectionPool.RETRY_DELAY
+        while True:
+            try:
+                return statement()
+            except sql.OperationalError as error:
+                if 'locked' not in str(error) and 'busy' not in str(error):
+                    raise
+                if time.monotonic() + delay > deadline:
+                    raise
+                logger.debug('Database %s is locked by another process, retrying in %.2fs', self.db_path, delay)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay = min(delay * 2, ConnectionPool.MAX_RETRY_DELAY)
+
+    def release(self, commit=True):
+        '''
+        Ends one level of Sql nesting for the calling thread
+
+        COMMIT can find the database locked in the rollback journal modes, while
+        another process is still reading; it is retried like BEGIN IMMEDIATE in
+        begin_write. If it still fails the transaction is rolled back before the
+        error is raised, so it cannot be committed by the next block that uses
+        the connection.
+
+        Parameters:
+            commit (bool) : commit the outstanding work if True, roll it back otherwise
+
+        Returns:
+            None
+        '''
+        local = self._local
+        local.depth -= 1
+        if local.depth > 0:
+            return
+        conn = local.conn
+        finished = False
+        try:
+            if commit and local.writing:
+                self._commit_write(conn)
+            elif commit:
+                self._retry_busy(conn.commit)
+            else:
+                conn.rollback()
+            finished = True
+        finally:
+            usable = True
+            if not finished:
+                try:
+                    conn.rollback()
+                except sql.Error:
+                    usable = False
+            with self._lock:
+                if not finished or conn.total_changes != local.changes:
+                    self.generation += 1
+            main_thread = threading.current_thread() is threading.main_thread()
+            if not usable or not main_thread:
+                local.conn = None
+            if usable and not main_thread:
+                with self._lock:
+                    if len(self._idle) < self.max_idle:
+                        self._idle.append(conn)
+                        conn = None
+            elif usable:
+                conn = None
+            if conn is not None:
+                with self._lock:
+                    if conn in self._pinned:
+                        self._pinned.remove(conn)
+                # closing a connection rolls back whatever it still has open
+                conn.close()
+                logger.debug("Closed connection to database %s", self.db_path)
+            # only now may the next writer start
+            if local.writing:
+                local.writing = False
+                self.writers.release()
+
+    @contextmanager
+    def borrow(self):
+        '''
+        Lends an idle connection for the duration of a with block
+
+        Used by long-running readers such as generators, which must not hold the
+        thread's own connection open across yields.
+        '''
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        '''
+        Closes every idle and pinned connection owned by the pool
+        '''
+        with self._lock:
+            conns = self._idle + self._pinned
+            if self._watcher is not None:
+                conns.append(self._watcher)
+            self._idle = []
+            self._pinned = []
+            self._watcher = None
+        self._local = threading.local()
+        for conn in conns:
+            conn.close()
+        logger.debug("Closed %d connection(s) to database %s", len(conns), self.db_path)
+
+
+class Sql:
+    """
+    Context manager for SQLite queries
+
+    Connections come from a ConnectionPool shared by every Sql block that uses the
+    same database path, so entering the context manager does not reopen the file.
+    Blocks can be nested on the same thread; the work is committed when the
+    outermost block exits, or rolled back if it exits with an exception. Blocks
+    that write should be opened with write=True, which starts the transaction with
+    the database's write lock held (see ConnectionPool.begin_write).
+
+    Attributes
+    ----------
+    db_path : str
+        The path to the database file
+
+    write : bool
+        Whether the block writes to the database
+
+    conn : sqlite3.connection
+        Connection to the database
+
+    cursor : sqlite3.connection.cursor
+        Cursor for executing sqlite queries
+
+    pools : dict[str, ConnectionPool]
+        The connection pool for each database path that has been used
+
+    Methods
+    --------
+    __enter__ : None
+        methods to execute when entering the context manager
+        borrows the thread's pooled connection and creates a cursor
+    
+    __exit__ : None
+        methods to execute when exiting the context manager
+        commits any changes written to the db then returns the connection to the pool
+
+    get_pool : ConnectionPool
+        returns the pool for a database path, creating it if needed
+
+    close_all : None
+        closes every pooled connection (call on shutdown)
+
+    """
+    pools = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(self, db_path, write=False):
+        self.db_path = db_path
+        self.write = write
+        self.conn = None
+        self.cursor = None
+        self._pool = None
+
+    @staticmethod
+    def get_pool(db_path):
+        '''
+        Returns the connection pool for a database, creating it on first use
+
+        Parameters:
+            db_path (str) : the path to the database
+
+        Returns:
+            pool (ConnectionPool) : the pool for the database
+        '''
+        with Sql._pools_lock:
+            pool = Sql.pools.get(db_path)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                Sql.pools[db_path] = pool
+            return pool
+
+    @staticmethod
+    def close_all():
+        '''
+        Closes the connections of every pool
+        '''
+        with Sql._pools_lock:
+            pools = list(Sql.pools.values())
+            Sql.pools.clear()
+        for pool in pools:
+            pool.close()
+
+    def __enter__(self):
+        '''
+        Executed on entering the context manager
+
+        Returns:
+            self.cursor (sqlite3.connection.cursor) : A cursor object to manipulate the current database. 
+
+        '''
+        self._pool = Sql.get_pool(self.db_path)
+        self.conn = self._pool.acquire(write=self.write)
+        self.cursor = self.conn.cursor()
+        return self.cursor
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cursor.close()
+        self._pool.release(commit=exc_type is None)
+
+
+class QueryCache:
+    """
+    A bounded read-through cache of the results of Database read methods
+
+    Results are kept in least recently used order and looked up by method name,
+    database path and arguments (see cached_query). Every lookup first runs
+    PRAGMA data_version on the calling thread's connection, which reads no table:
+    if it has changed since that connection last looked, another connection (a
+    thread or another copy of the programme) has committed, and the whole cache
+    is dropped. Commits made in this process are caught by the connection pool's
+    generation, which goes up whenever a commit changed rows. A result is only
+    stored if nothing was invalidated while it was being read, so an entry never
+    holds data older than the last change seen. Reads inside a transaction are
+    not cached, as they can see changes that are not committed.
+
+    Attributes
+    ----------
+    max_entries : int
+        the number of results kept
+
+    enabled : bool
+        if False every lookup runs the query
+
+    hits, misses : int
+        lookups served from the cache and lookups that ran the query
+
+    Methods
+    -------
+    lookup : object
+        returns the cached result for a key, or computes and stores it
+
+    clear : None
+        drops every entry
+
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._written = None
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._entries.clear()
+        self._epoch += 1
+
+    def lookup(self, cursor, pool, key, compute):
+        '''
+        Returns the cached result for key, or calls compute and caches what it returns
+
+        Parameters:
+            cursor (sqlite3.connection.cursor) : a cursor on the calling thread's connection
+            pool (ConnectionPool) : the pool the connection belongs to
+            key (tuple) : what identifies the query and its parameters
+            compute (callable) : runs the query
+
+        Returns:
+            result : what compute returned for this key
+        '''
+        conn = cursor.connection
+        if not self.enabled or conn.in_transaction:
+            return compute()
+        cursor.execute('PRAGMA data_version')
+        version = cursor.fetchone()[0]
+        with self._lock:
+            written = (pool, pool.generation)
+            if conn.data_version != version or self._written != written:
+                # a connection seen for the first time has no version to compare, so it clears too
+                self._clear()
+                conn.data_version = version
+                self._written = written
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            epoch = self._epoch
+        result = compute()
+        with self._lock:
+            if self._epoch == epoch and self._written == (pool, pool.generation):
+                self._entries[key] = result
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+
+def cached_query(func):
+    '''
+    Serves a Database read method from Database.query_cache (see QueryCache)
+
+    The method's arguments must be hashable. A list result is copied for each
+    caller, but the objects in it are shared and must not be changed.
+    '''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__name__, Database.db_path, args, tuple(sorted(kwargs.items())))
+        with Sql(Database.db_path) as cursor:
+            result = Database.query_cache.lookup(cursor, Sql.get_pool(Database.db_path), key,
+                                                 lambda: func(*args, **kwargs))
+        return list(result) if isinstance(result, list) else result
+    return wrapper
+
+
+class PreparedBlob:
+    """
+    An attachment's contents after Database.prepare_blob, ready to be written
+
+    Attributes
+    ----------
+    attachment : Attachment
+        the attachment, with hash, size, mime_type and created_at filled in
+
+    codec : str
+        the codec the contents were compressed with, None if they are stored raw
+
+    stored_size : int
+        the number of bytes that will be written
+
+    Methods
+    -------
+    open : file
+        the bytes to write: the spooled compressed data, or the original file if raw
+
+    close : None
+        discards the spooled data without writing it
+
+    """
+    def __init__(self, attachment, codec, source, stored_size):
+        self.attachment = attachment
+        self.codec = codec
+        self.stored_size = stored_size
+        self._source = source
+
+    def open(self):
+        if self._source is not None:
+            return self._source
+        return open(self.attachment.filepath, 'rb')
+
+    def close(self):
+        if self._source is not None:
+            self._source.close()
+
+
+class Database(ABC):
+    '''
+    Abstract base class for a database
+    '''
+    db_path = ''
+    CHUNK_SIZE = 1024 * 1024
+    SPOOL_SIZE = 8 * 1024 * 1024  # compressed or decompressed data larger than this goes to a temporary file
+    EXTERNAL_THRESHOLD = 1024 * 1024  # blobs this size or larger are kept in the blob store, None keeps all inline
+    PREPARE_WORKERS = 4  # threads reading, hashing and compressing new attachments (see prepare_blobs)
+    query_cache = QueryCache()  # results of the read methods marked @cached_query
+    JOURNAL_MODE = None  # set on the database by prepare_tables (the GUI reads it from config.ini), None leaves it as it is
+    CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.ini')
+
+    @staticmethod
+    def configure(db_path=None):
+        '''
+        Points Database at db_path, or at the db_path in config.ini when it is None
+
+        The command line tools call this with their --db argument.
+
+        Parameters:
+            db_path (str) : optional, the database to use instead of the configured one
+
+        Returns:
+            config (configparser.ConfigParser) : config.ini, for any other settings the caller needs
+        '''
+        import configparser
+        config = configparser.ConfigParser()
+        config.read(Database.CONFIG_PATH)
+        Database.db_path = db_path or config['DATABASE']['db_path']
+        return config
+
+    @staticmethod
+    def prepare_tables():
+        '''
+        Creates the required database tables if they aren't there
+        and upgrades older databases to the current schema (see migrations.py)
+        
+        Parameters:
+            db_path (str) : the path to the database
+
+        Returns:
+            None
+        '''
+        pool = Sql.get_pool(Database.db_path)
+        with Sql(Database.db_path) as cursor:
+            pool.run_locked(lambda: migrations.initialise(cursor))
+        if Database.JOURNAL_MODE:
+            Database.set_journal_mode(Database.JOURNAL_MODE)
+        migrations.migrate(lambda write: Sql(Database.db_path, write=write))
+        with Sql(Database.db_path) as cursor:
+            scans = migrations.check_query_plans(cursor)
+        for name, plan in scans.items():
+            logger.warning('Query "%s" scans a whole table: %s', name, plan)
+        logger.debug('Tables created in %s', Database.db_path)
+
+    @staticmethod
+    def set_journal_mode(mode):
+        '''
+        Switches the database to a journal mode, which is recorded in the file for every connection
+
+        In WAL mode readers, in this process or others, keep reading while a
+        transaction is written, and commits are cheaper. WAL needs every programme
+        using the file to run on the same computer; for a database kept on a network
+        share use 'delete', the rollback journal SQLite uses by default.
+
+        Parameters:
+            mode (str) : 'wal', 'delete', 'truncate' or 'persist'
+
+        Returns:
+            mode (str) : the journal mode in effect, which is unchanged if SQLite could not switch
+        '''
+        pool = Sql.get_pool(Database.db_path)
+        with Sql(Database.db_path) as cursor:
+            # switching needs the file to itself, so it waits its turn like a write
+            current = pool.run_locked(lambda: cursor.execute('PRAGMA journal_mode = {}'.format(mode)).fetchone()[0])
+            if current == 'wal':
+                cursor.execute('PRAGMA synchronous = NORMAL')
+        if current != mode.lower():
+            logger.warning('Could not switch %s to journal_mode %s, it is using %s', Database.db_path, mode, current)
+        return current
+
+    @staticmethod
+    def checkpoint():
+        '''
+        Copies the write-ahead log into the database file and truncates it
+
+        Only does anything in WAL mode. Readers and writers in other processes can
+        keep the log in use, in which case only part of it is copied.
+
+        Returns:
+            (busy, log_pages, copied_pages) (tuple[int, int, int]) : as PRAGMA wal_checkpoint
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            return cursor.fetchone()
+
+    @staticmethod
+    def check_query_plans():
+        '''
+        Checks with EXPLAIN QUERY PLAN that the hot queries are served by indexes
+
+        Returns:
+            scans (dict[str, list[str]]) : the plan of every hot query that scans a whole table
+        '''
+        with Sql(Database.db_path) as cursor:
+            return migrations.check_query_plans(cursor)
+
+    @staticmethod
+    def hash_file(filepath, chunk_size=None):
+        '''
+        Computes the SHA-256 content hash of a file without reading it into memory at once
+
+        Parameters:
+            filepath (str) : the path to the file
+            chunk_size (int) : the number of bytes read at a time
+
+        Returns:
+            digest (str) : the hex digest of the file contents
+        '''
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size or Database.CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def write_file_to_blob(cursor, row_id, filepath, progress=None):
+        '''
+        Streams a file into a filedata row that was reserved with zeroblob(size)
+
+        The file is copied in CHUNK_SIZE pieces through SQLite incremental blob I/O,
+        so memory use is bounded by the chunk size rather than the file size.
+
+        Parameters:
+            cursor (sqlite3.connection.cursor) : a cursor on the connection holding the open transaction
+            row_id (int) : the id of the filedata row to write into
+            filepath (str) : the file to copy
+            progress (callable) : optional, called as progress(bytes_written, total_bytes) after each chunk
+
+        Returns:
+            None
+        '''
+        with open(filepath, 'rb') as f:
+            Database.write_stream_to_blob(cursor, row_id, f, os.path.getsize(filepath), progress)
+
+    @staticmethod
+    def write_stream_to_blob(cursor, row_id, source, total, progress=None):
+        '''
+        Streams an open binary file into a filedata row that was reserved with zeroblob(total)
+
+        See write_file_to_blob.
+        '''
+        written = 0
+        with cursor.connection.blobopen('filedata', 'data', row_id, readonly=False) as blob:
+            for chunk in iter(lambda: source.read(Database.CHUNK_SIZE), b''):
+                blob.write(chunk)
+                written += len(chunk)
+                if progress is not None:
+                    progress(written, total)
+
+    @staticmethod
+    def is_external_size(stored_size, threshold=None):
+        '''
+        Returns True if a blob of this many (stored) bytes belongs in the blob store rather than the database
+        '''
+        threshold = Database.EXTERNAL_THRESHOLD if threshold is None else threshold
+        return threshold is not None and stored_size > 0 and stored_size >= threshold
+
+    @staticmethod
+    def blob_store_dir():
+        '''
+        Returns the directory holding blobs stored outside the database, e.g. expenses.blobs beside expenses.db
+        '''
+        return os.path.splitext(os.path.abspath(Database.db_path))[0] + '.blobs'
+
+    @staticmethod
+    def blob_store_path(digest):
+        '''
+        Returns the path of the blob store file for a content hash
+        '''
+        return os.path.join(Database.blob_store_dir(), digest[:2], digest)
+
+    @staticmethod
+    def write_stream_to_store(digest, source, total, progress=None):
+        '''
+        Streams an open binary file into the blob store under its content hash
+
+        The data goes to a temporary file that is synced and then renamed into
+        place, so a store file is either complete or absent. A file already stored
+        under the hash is kept as it is.
+
+        Parameters:
+            digest (str) : the SHA-256 hex digest of the original contents
+            source (file) : the data to store, as it is to be stored (i.e. compressed if it has a codec)
+            total (int) : the number of bytes in source
+            progress (callable) : optional, called as progress(bytes_written, total_bytes) after each chunk
+
+        Returns:
+            filepath (str) : the store file
+        '''
+        filepath = Database.blob_store_path(digest)
+        if os.path.exists(filepath) and os.path.getsize(filepath) == total:
+            if progress is not None:
+                progress(total, total)
+            return filepath
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        written = 0
+        import tempfile
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(filepath), suffix='.tmp', delete=False) as f:
+            try:
+                for chunk in iter(lambda: source.read(Database.CHUNK_SIZE), b''):
+                    f.write(chunk)
+                    written += len(chunk)
+                    if progress is not None:
+                        progress(written, total)
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                f.close()
+                os.remove(f.name)
+                raise
+        os.replace(f.name, filepath)
+        return filepath
+
+    @staticmethod
+    def prepare_blob(attachment):
+        '''
+        Reads an attachment's file once to work out everything needed to store it
+
+        The file is hashed and, if blobcodecs.choose_codec says so for the MIME type
+        sniffed from its first chunk, compressed into a spooled temporary file in the
+        same pass. The database is not touched, so files can be prepared on several
+        threads at once (see prepare_blobs). Fills in the attachment's hash, size,
+        mime_type and created_at.
+
+        Parameters:
+            attachment (Attachment) : an attachment with filepath set
+
+        Returns:
+            prepared (PreparedBlob) : the contents ready for _write_blob
+        '''
+        import tempfile
+        digest = hashlib.sha256()
+        size = 0
+        with open(attachment.filepath, 'rb') as f:
+            first = f.read(Database.CHUNK_SIZE)
+            attachment.mime_type = filetypes.guess_mime_type(attachment.filepath, first[:filetypes.HEAD_SIZE])
+            codec = blobcodecs.choose_codec(attachment.mime_type)
+
+            def chunks():
+                nonlocal size
+                for chunk in itertools.chain([first], iter(lambda: f.read(Database.CHUNK_SIZE), b'')):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    yield chunk
+
+            source = None
+            if codec is None:
+                for _ in chunks():
+                    pass
+            else:
+                # compressed data is spooled to a temporary file rather than memory, and its
+                # size is needed for zeroblob before anything is written to the database
+                source = tempfile.SpooledTemporaryFile(max_size=Database.SPOOL_SIZE)
+                for data in blobcodecs.compress_chunks(chunks(), codec):
+                    source.write(data)
+        attachment.hash = digest.hexdigest()
+        attachment.size = size
+        if attachment.created_at is None:
+            attachment.created_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+        stored_size = size
+        if source is not None:
+            stored_size = source.tell()
+            source.seek(0)
+            if stored_size > size * blobcodecs.MAX_RATIO:
+                source.close()
+                codec, source, stored_size = None, None, size
+        return PreparedBlob(attachment, codec, source, stored_size)
+
+    @staticmethod
+    def prepare_blobs(attachments, max_workers=None):
+        '''
+        Prepares attachments on a thread pool, yielding them in order as they become ready
+
+        Hashing, compression and file reads release the GIL, so the files are read
+        and processed in parallel while the caller writes the ones already prepared.
+        At most twice max_workers files are prepared ahead of the caller, which
+        bounds the memory held in spooled compressed data.
+
+        Parameters:
+            attachments (list[Attachment]) : the attachments to prepare
+            max_workers (int) : the number of threads, PREPARE_WORKERS by default
+
+        Returns:
+            prepared (iterator[PreparedBlob]) : one per attachment, in the same order
+        '''
+        attachments = iter(attachments)
+        max_workers = max_workers or Database.PREPARE_WORKERS
+        if max_workers <= 1:
+            for attachment in attachments:
+                yield Database.prepare_blob(attachment)
+            return
+        import concurrent.futures
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prepare') as pool:
+            try:
+                for attachment in itertools.islice(attachments, max_workers * 2):
+                    pending.append(pool.submit(Database.prepare_blob, attachment))
+                while pending:
+                    future = pending.popleft()
+                    attachment = next(attachments, None)
+                    if attachment is not None:
+                        pending.append(pool.submit(Database.prepare_blob, attachment))
+                    yield future.result()
+            finally:
+                # the caller stopped early (an error or a cancelled job): drop what was prepared ahead
+                for future in pending:
+                    if not future.cancel():
+                        try:
+                            future.result().close()
+                        except Exception:
+                            pass
+
+    @staticmethod
+    def _write_blob(cursor, prepared, progress=None):
+        '''
+        Stores prepared attachment contents once per distinct content
+
+        If a blob with the same SHA-256 hash is already stored nothing is written.
+        New content is streamed into a zeroblob placeholder in chunks, or into the
+        blob store if it is at least EXTERNAL_THRESHOLD bytes. The blob's reference
+        count is raised by a trigger when the attachments row pointing at it is inserted.
+        '''
+        attachment = prepared.attachment
+        size = attachment.size
+        with prepared.open() as source:
+            cursor.execute('''
+                SELECT 1 FROM filedata WHERE hash = ?
+                ''', (attachment.hash,))
+            if cursor.fetchone() is not None:
+                if progress is not None:
+                    progress(attachment, size, size)
+                return
+            report = None
+            if progress is not None:
+                report = lambda done, total: progress(attachment, done * size // max(total, 1), size)
+            if Database.is_external_size(prepared.stored_size):
+                Database.write_stream_to_store(attachment.hash, source, prepared.stored_size, report)
+                cursor.execute('''
+                    INSERT INTO filedata (hash, refcount, codec, external)
+                    VALUES (?, 0, ?, 1)
+                    ''', (attachment.hash, prepared.codec))
+            else:
+                cursor.execute('''
+                    INSERT INTO filedata (hash, refcount, codec, data)
+                    VALUES (?, 0, ?, zeroblob(?))
+                    ''', (attachment.hash, prepared.codec, prepared.stored_size))
+                Database.write_stream_to_blob(cursor, cursor.lastrowid, source, prepared.stored_size, report)
+
+    @staticmethod
+    def _store_attachments(cursor, transaction_id, attachments, progress=None):
+        '''
+        Stores the contents of a transaction's new attachments and inserts their attachments rows
+
+        Files are prepared in parallel by prepare_blobs while this thread, the only
+        one using the database, writes each as soon as it is ready. The attachments
+        rows are inserted together at the end. Ids come from MAX(id); the caller
+        has already written in this transaction, so it holds the write lock.
+        '''
+        if len(attachments) == 0:
+            return
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM attachments')
+        next_id = cursor.fetchone()[0] + 1
+        rows = []
+        for prepared in Database.prepare_blobs(attachments):
+            Database._write_blob(cursor, prepared, progress)
+            attachment = prepared.attachment
+            attachment.id = next_id
+            attachment.transaction_id = transaction_id
+            next_id += 1
+            rows.append(attachment.metadata_row())
+        cursor.executemany('''
+            INSERT INTO attachments ({})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            '''.format(Attachment.COLUMNS), rows)
+
+    @staticmethod
+    def add_transaction(transaction, progress=None):
+        '''
+        Enters a new transaction into the transactions table
+        Enters the associated attachments into the attachments table
+
+        Parameters:
+            db_path (str) : the path to the current database
+            transaction (Transaction) : the transaction to add
+            progress (callable) : optional, called as progress(attachment, bytes_written, total_bytes)
+                while attachment contents are written
+
+        Returns:
+            transaction_id (int) : the id of the new row, also stored on transaction.id
+        '''
+
+
+        with Sql(Database.db_path, write=True) as cursor:
+            cursor.execute('''
+                INSERT INTO transactions (name, amount, date, iso_date, notes)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (transaction.name, money.to_pence(transaction.amount), transaction.date, dates.to_iso(transaction.date),
+                      transaction.notes))
+            transaction_id = cursor.lastrowid
+            transaction.id = transaction_id
+            Database._store_attachments(cursor, transaction_id, transaction.attachments, progress)
+        return transaction_id
+
+
+    @staticmethod
+    def add_transactions(transactions, batch_size=5000, progress=None):
+        '''
+        Enters many transactions and their attachments in a single database transaction
+
+        Rows are written with executemany in batches of batch_size so memory use does not
+        depend on how many transactions the iterable yields. Ids are allocated from
+        MAX(id) while the write lock is held, so they are known without a query per row
+        and are stored on each Transaction and Attachment. Nothing is committed unless
+        every transaction is written.
+
+        Parameters:
+            transactions (iterable[Transaction]) : the transactions to add
+            batch_size (int) : the number of transactions passed to each executemany call
+            progress (callable) : optional, called as progress(transactions_written) after each batch
+
+        Returns:
+            count (int) : the number of transactions added
+        '''
+        count = 0
+        transactions = iter(transactions)
+        with Sql(Database.db_path, write=True) as cursor:
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM transactions')
+            next_id = cursor.fetchone()[0] + 1
+            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM attachments')
+            next_attachment_id = cursor.fetchone()[0] + 1
+            while True:
+                batch = list(itertools.islice(transactions, batch_size))
+                if len(batch) == 0:
+                    break
+                rows = []
+                attachments = []
+                for transaction in batch:
+                    transaction.id = next_id
+                    next_id += 1
+                    rows.append((transaction.id, transaction.name, money.to_pence(transaction.amount), transaction.date,
+                                 dates.to_iso(transaction.date), transaction.notes))
+                    for attachment in transaction.attachments:
+                        attachment.transaction_id = transaction.id
+                        attachments.append(attachment)
+                attachment_rows = []
+                for prepared in Database.prepare_blobs(attachments):
+                    Database._write_blob(cursor, prepared)
+                    attachment = prepared.attachment
+                    attachment.id = next_attachment_id
+                    next_attachment_id += 1
+                    attachment_rows.append(attachment.metadata_row())
+                cursor.executemany('''
+                    INSERT INTO transactions (id, name, amount, date, iso_date, notes)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ''', rows)
+                cursor.executemany('''
+                    INSERT INTO attachments ({})
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    '''.format(Attachment.COLUMNS), attachment_rows)
+                count += len(batch)
+                if progress is not None:
+                    progress(count)
+        return count
+
+    @staticmethod
+    def transaction_from_row(row):
+        '''
+        Builds a TransactionRow from a (id, name, amount, date, notes) row
+
+        Parameters:
+            row (tuple) : a row from the transactions table, amount in pence
+
+        Returns:
+            transaction (TransactionRow) : the transaction the row represents
+        '''
+        return TransactionRow(row)
+
+    @staticmethod
+    def get_all_transactions():
+        '''
+        Gets all transactions currently in the transactions table
+
+        Parameters:
+            db_path (str) : the path to the current database
+
+        Returns:
+            transactions (list[TransactionRow]) : the list of transactions in the database
+            Does not populate the attachments list for each transaction -> see get_attachments_for_transaction
+        
+        '''
+
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT id, name, amount, date, notes FROM transactions
+                '''
+            )
+            return list(map(TransactionRow, cursor.fetchall()))
+
+    @staticmethod
+    def iter_transaction_batches(start_date=None, end_date=None, name=None, batch_size=1000):
+        '''
+        Yields the transactions table in batches of raw rows without loading it all
+
+        The filters are applied in SQL and rows are pulled with fetchmany, so memory use
+        is bounded by batch_size. A dedicated connection is borrowed from the pool for
+        as long as the generator runs.
+
+        Parameters:
+            start_date (str) : optional, earliest date to include, YYYY-MM-DD
+            end_date (str) : optional, latest date to include, YYYY-MM-DD
+            name (str) : optional, only include transactions made by this person (case insensitive)
+            batch_size (int) : the number of rows per batch
+
+        Yields:
+            rows (list[tuple]) : (id, name, amount, date, notes) rows with amount in pence, in date order when
+                a date range is given and in id order otherwise
+        '''
+        conditions = []
+        parameters = []
+        if start_date is not None:
+            conditions.append('iso_date >= ?')
+            parameters.append(start_date)
+        if end_date is not None:
+            conditions.append('iso_date <= ?')
+            parameters.append(end_date)
+        if name is not None:
+            conditions.append('name = ? COLLATE NOCASE')
+            parameters.append(name)
+        query = 'SELECT id, name, amount, date, notes FROM transactions'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        if start_date is not None or end_date is not None:
+            # walk the iso_date index in order rather than sorting the range
+            query += ' ORDER BY iso_date, id'
+        else:
+            query += ' ORDER BY id'
+        with Sql.get_pool(Database.db_path).borrow() as conn:
+            cursor = conn.execute(query, parameters)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if len(rows) == 0:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+
+    @staticmethod
+    @cached_query
+    def get_transactions_between(start_date, end_date, limit=None):
+        '''
+        Gets the transactions dated within a range, using the iso_date index
+
+        Parameters:
+            start_date (str) : earliest date to include, YYYY-MM-DD
+            end_date (str) : latest date to include, YYYY-MM-DD
+            limit (int) : optional, the maximum number of transactions to return
+
+        Returns:
+            transactions (list[TransactionRow]) : the transactions in date order
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT id, name, amount, date, notes FROM transactions
+                WHERE iso_date BETWEEN ? AND ?
+                ORDER BY iso_date, id
+                LIMIT ?
+                ''', (start_date, end_date, -1 if limit is None else limit))
+            return list(map(TransactionRow, cursor.fetchall()))
+
+    @staticmethod
+    @cached_query
+    def count_transactions_between(start_date, end_date):
+        '''
+        Counts the transactions dated within a range, YYYY-MM-DD inclusive
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT COUNT(*) FROM transactions
+                WHERE iso_date BETWEEN ? AND ?
+                ''', (start_date, end_date))
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    @cached_query
+    def search(query, limit=100):
+        '''
+        Full text search over transaction names, notes and attachment names
+
+        Each word of the query must match the start of a word in the transaction, so
+        partial input works for search-as-you-type. Results are ranked by relevance.
+
+        Parameters:
+            query (str) : the words to look for
+            limit (int) : the maximum number of transactions to return
+
+        Returns:
+            transactions (list[TransactionRow]) : the best matches first
+        '''
+        words = query.split()
+        if len(words) == 0:
+            return []
+        match = ' '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT transactions.id, transactions.name, transactions.amount, transactions.date, transactions.notes
+                FROM transactions_fts
+                JOIN transactions ON transactions.id = transactions_fts.rowid
+                WHERE transactions_fts MATCH ?
+                ORDER BY transactions_fts.rank
+                LIMIT ?
+                ''', (match, limit))
+            return list(map(TransactionRow, cursor.fetchall()))
+
+    @staticmethod
+    @cached_query
+    def get_spending_summary(start_month, end_month, name=None, by_month=True):
+        '''
+        Reads spending totals from the monthly_summary table kept up to date by triggers
+
+        Parameters:
+            start_month (str) : first month to include, YYYY-MM
+            end_month (str) : last month to include, YYYY-MM
+            name (str) : optional, only include this person
+            by_month (bool) : one row per month and person if True, one row per person otherwise
+
+        Returns:
+            rows (list[tuple]) : (month, name, total, count) rows, total in pounds (Decimal),
+                month is None when by_month is False
+        '''
+        conditions = 'month BETWEEN ? AND ?'
+        parameters = [start_month, end_month]
+        if name is not None:
+            conditions += ' AND name = ?'
+            parameters.append(name)
+        with Sql(Database.db_path) as cursor:
+            if by_month:
+                cursor.execute('''
+                    SELECT month, name, total, count FROM monthly_summary
+                    WHERE {}
+                    ORDER BY month, name
+                    '''.format(conditions), parameters)
+            else:
+                cursor.execute('''
+                    SELECT NULL, name, SUM(total), SUM(count) FROM monthly_summary
+                    WHERE {}
+                    GROUP BY name
+                    ORDER BY name
+                    '''.format(conditions), parameters)
+            return [(month, name, money.from_pence(total), count) for month, name, total, count in cursor.fetchall()]
+
+    @staticmethod
+    def get_year_summary(year, by_month=False):
+        '''
+        Spending per person for a calendar year, see get_spending_summary
+        '''
+        return Database.get_spending_summary('{}-01'.format(year), '{}-12'.format(year), by_month=by_month)
+
+    @staticmethod
+    def rebuild_summaries():
+        '''
+        Recomputes the monthly_summary table from scratch, e.g. after editing the database by hand
+        '''
+        with Sql(Database.db_path, write=True) as cursor:
+            migrations.rebuild_monthly_summary(cursor)
+
+    @staticmethod
+    @cached_query
+    def get_transaction_rows(after_id=0, limit=50):
+        '''
+        Gets a page of raw transaction rows using keyset pagination
+
+        Only rows with an id greater than after_id are read, in id order, so the cost
+        of fetching a page does not depend on how far into the table it is.
+
+        Parameters:
+            after_id (int) : the id of the last row of the previous page (0 for the first page)
+            limit (int) : the maximum number of rows to return
+
+        Returns:
+            rows (list[tuple]) : (id, name, amount, date, notes) rows, amount in pence
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT id, name, amount, date, notes FROM transactions
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                ''', (after_id, limit))
+            return cursor.fetchall()
+
+    @staticmethod
+    def get_attachments_for_transaction(transaction_id):
+        '''
+        Gets all the attachments associated with a given transaction
+
+        Only the attachments table is read, never the file contents; see Attachment.data.
+
+        Parameters:
+            db_path (str) : the path to the current database
+            transaction_id (int) : the id of the transaction to fetch attachments for
+        
+        Returns:
+            attachments (list[Attachment]) : A list of attachment objects where the 
+            transaction_id parameter in the table matches the transaction_id parameter
+
+        '''
+        return [Attachment.from_row(row) for row in Database._get_attachment_rows(transaction_id)]
+
+    @staticmethod
+    @cached_query
+    def _get_attachment_rows(transaction_id):
+        # the rows are cached rather than the Attachments, which keep their data once read
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT {} FROM attachments
+                WHERE transaction_id = ?
+                ORDER BY id
+                '''.format(Attachment.COLUMNS), (transaction_id,))
+            return cursor.fetchall()
+
+    @staticmethod
+    def add_attachments_to_transaction(transaction, attachments):
+        for attachment in attachments:
+            transaction.attachments.append(attachment)
+
+    @staticmethod
+    def delete_transaction(transaction_id):
+        with Sql(Database.db_path, write=True) as cursor:
+            cursor.execute('''
+                DELETE FROM transactions
+                WHERE id = ?
+                ''', (transaction_id,))
+            cursor.execute('''
+                DELETE FROM attachments
+                WHERE transaction_id = ?
+                ''', (transaction_id,))
+
+    @staticmethod
+    def collect_garbage(batch_size=500):
+        '''
+        Deletes filedata rows that no attachment refers to
+
+        Orphans are found through the hash and fileID indexes, so blob pages are never
+        read, and deleted batch_size rows at a time with a commit after each batch so
+        other connections are only locked out briefly.
+
+        Parameters:
+            batch_size (int) : the maximum number of rows deleted per transaction
+
+        Returns:
+            deleted (int) : the number of filedata rows deleted
+        '''
+        deleted = 0
+        last_hash = ''
+        while True:
+            with Sql(Database.db_path, write=True) as cursor:
+                cursor.execute('''
+                    SELECT id, hash FROM filedata
+                    WHERE hash > ?
+                    AND NOT EXISTS (SELECT 1 FROM attachments WHERE attachments.hash = filedata.hash)
+                    ORDER BY hash
+                    LIMIT ?
+                    ''', (last_hash, batch_size))
+                rows = cursor.fetchall()
+                cursor.executemany('DELETE FROM filedata WHERE id = ?', [(row[0],) for row in rows])
+            deleted += len(rows)
+            if len(rows) < batch_size:
+                break
+            last_hash = rows[-1][1]
+        # blobs stored before content addressing, keyed by attachment id
+        while True:
+            with Sql(Database.db_path, write=True) as cursor:
+                cursor.execute('''
+                    DELETE FROM filedata WHERE id IN (
+                        SELECT id FROM filedata
+                        WHERE hash IS NULL
+                        AND NOT EXISTS (SELECT 1 FROM attachments WHERE attachments.id = filedata.fileID)
+                        LIMIT ?
+                        )
+                    ''', (batch_size,))
+                count = cursor.rowcount
+            deleted += count
+            if count < batch_size:
+                break
+        removed = Database.sweep_blob_store()
+        logger.debug('Garbage collected %d blob(s) and %d blob store file(s)', deleted, removed)
+        return deleted
+
+    @staticmethod
+    def sweep_blob_store(grace_seconds=3600):
+        '''
+        Deletes blob store files that no filedata row refers to
+
+        Store files are left behind when their filedata row is deleted, or when the
+        transaction that wrote them was rolled back. Files changed in the last
+        grace_seconds are kept, as another process may be about to commit a row for them.
+
+        Returns:
+            removed (int) : the number of files deleted
+        '''
+        store = Database.blob_store_dir()
+        if not os.path.isdir(store):
+            return 0
+        removed = 0
+        cutoff = time.time() - grace_seconds
+        with Sql(Database.db_path) as cursor:
+            for directory, _, filenames in os.walk(store):
+                for filename in filenames:
+                    filepath = os.path.join(directory, filename)
+                    try:
+                        if os.path.getmtime(filepath) > cutoff:
+                            continue
+                    except OSError:
+                        continue
+                    if not filename.endswith('.tmp'):
+                        cursor.execute('''
+                            SELECT 1 FROM filedata WHERE hash = ? AND external = 1
+                            ''', (filename,))
+                        if cursor.fetchone() is not None:
+                            continue
+                    try:
+                        os.remove(filepath)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    @staticmethod
+    def move_blob(row_id, external):
+        '''
+        Moves one blob between the database and the blob store, in its own transaction
+
+        Parameters:
+            row_id (int) : the id of the filedata row
+            external (bool) : True to move it to the blob store, False to move it into the database
+
+        Returns:
+            moved (bool) : False if the blob was already where it was asked to go
+        '''
+        with Sql(Database.db_path, write=True) as cursor:
+            cursor.execute('''
+                SELECT hash, codec, external, length(data) FROM filedata WHERE id = ?
+                ''', (row_id,))
+            row = cursor.fetchone()
+            if row is None or bool(row[2]) == bool(external) or row[0] is None:
+                return False
+            digest, codec, _, size = row
+            if external and not size:
+                # an empty file cannot be memory-mapped, and takes no space in the database
+                return False
+            if external:
+                with Database.open_stored_blob(cursor, (row_id, codec, digest, 0)) as source:
+                    Database.write_stream_to_store(digest, source, size or 0)
+                cursor.execute('''
+                    UPDATE filedata SET external = 1, data = NULL WHERE id = ?
+                    ''', (row_id,))
+            else:
+                filepath = Database.blob_store_path(digest)
+                cursor.execute('''
+                    UPDATE filedata SET external = 0, data = zeroblob(?) WHERE id = ?
+                    ''', (os.path.getsize(filepath), row_id))
+                Database.write_file_to_blob(cursor, row_id, filepath)
+        if not external:
+            try:
+                os.remove(Database.blob_store_path(digest))
+            except OSError:
+                # sweep_blob_store deletes it later
+                pass
+        return True
+
+    @staticmethod
+    def incremental_vacuum(pages_per_step=256, max_steps=None):
+        '''
+        Returns free pages to the filesystem a few at a time
+
+        Each step frees at most pages_per_step pages in its own short transaction,
+        so unlike VACUUM the database stays usable while it runs. Only has an effect
+        when auto_vacuum is INCREMENTAL (see enable_incremental_vacuum).
+
+        Parameters:
+            pages_per_step (int) : the number of pages freed per transaction
+            max_steps (int) : optional, stop after this many steps
+
+        Returns:
+            freed (int) : the number of pages returned to the filesystem
+        '''
+        freed = 0
+        steps = 0
+        while max_steps is None or steps < max_steps:
+            with Sql(Database.db_path, write=True) as cursor:
+                cursor.execute('PRAGMA auto_vacuum')
+                if cursor.fetchone()[0] != 2:
+                    logger.info('auto_vacuum is not INCREMENTAL, nothing reclaimed')
+                    break
+                cursor.execute('PRAGMA freelist_count')
+                before = cursor.fetchone()[0]
+                if before == 0:
+                    break
+                # execute() stops after freeing one page as the pragma returns no rows
+                cursor.executescript('PRAGMA incremental_vacuum({});'.format(int(pages_per_step)))
+                cursor.execute('PRAGMA freelist_count')
+                freed += before - cursor.fetchone()[0]
+            steps += 1
+        return freed
+
+    @staticmethod
+    def incremental_vacuum_enabled():
+        '''
+        Returns True if the database uses auto_vacuum=INCREMENTAL, so compact can return space to the filesystem
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('PRAGMA auto_vacuum')
+            return cursor.fetchone()[0] == 2
+
+    @staticmethod
+    def enable_incremental_vacuum():
+        '''
+        Switches an existing database to auto_vacuum=INCREMENTAL
+
+        Databases created by this programme already use it; older ones need a single
+        full VACUUM to change mode. It rewrites the whole file and other connections
+        cannot write while it runs, so the GUI asks first (see MainWindow.compact_database)
+        and blobstore.py only does it with --enable-incremental-vacuum.
+
+        Returns:
+            freed (int) : the number of pages the VACUUM returned to the filesystem, 0 if
+                the database was already INCREMENTAL
+        '''
+        pool = Sql.get_pool(Database.db_path)
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('PRAGMA auto_vacuum')
+            if cursor.fetchone()[0] == 2:
+                return 0
+            cursor.execute('PRAGMA page_count')
+            before = cursor.fetchone()[0]
+
+            def vacuum():
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+            pool.run_locked(vacuum)
+            cursor.execute('PRAGMA page_count')
+            freed = before - cursor.fetchone()[0]
+        # in WAL mode the rewritten pages are in the log until it is checkpointed
+        Database.checkpoint()
+        return freed
+
+    @staticmethod
+    def compact():
+        '''
+        Deletes unreferenced blobs then reclaims the space they used
+
+        Returns:
+            (deleted, freed) (tuple[int, int]) : blobs deleted and pages returned to the filesystem
+        '''
+        deleted = Database.collect_garbage()
+        freed = Database.incremental_vacuum()
+        # in WAL mode the file only shrinks once the freed pages are checkpointed
+        Database.checkpoint()
+        return deleted, freed
+
+
+    
+    @staticmethod
+    def modify_transaction(transaction):
+        with Sql(Database.db_path, write=True) as cursor:
+            cursor.execute('''
+                UPDATE transactions
+                SET name = ?, amount = ?, date = ?, iso_date = ?, notes = ?
+                WHERE id = ?
+                ''', (transaction.name, money.to_pence(transaction.amount), transaction.date, dates.to_iso(transaction.date),
+                      transaction.notes, transaction.id))
+            Database._store_attachments(cursor, transaction.id, transaction.attachments)
+
+    @staticmethod
+    def get_next_transaction_id():
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT COALESCE(MAX(id), 0) + 1 FROM transactions
+                '''
+            )
+            return cursor.fetchone()[0]
+    
+    @staticmethod
+    def find_blob(fileID):
+        '''
+        Gets where an attachment's contents are stored and how
+
+        Parameters:
+            fileID (int) : the id of the attachment
+
+        Returns:
+            (row_id, codec, hash, external) (tuple[int, str, str, int]) : the filedata row id,
+                codec (None if stored raw), content hash and whether it is in the blob store,
+                or None if nothing is stored for the attachment
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT filedata.id, filedata.codec, filedata.hash, filedata.external FROM attachments
+                JOIN filedata ON filedata.hash = attachments.hash
+                WHERE attachments.id = ?
+                ''', (fileID,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('''
+                    SELECT id, codec, hash, external FROM filedata
+                    WHERE fileID = ?
+                    ''', (fileID,))
+                row = cursor.fetchone()
+            return row
+
+    @staticmethod
+    @contextmanager
+    def open_stored_blob(cursor, blob):
+        '''
+        Opens the stored (possibly compressed) bytes of a blob found with find_blob for reading
+
+        Blobs in the database are opened with incremental blob I/O, blob store files
+        are memory-mapped. Both give a read-only file-like object with read, seek and tell.
+        '''
+        row_id, _, digest, external = blob
+        if external:
+            with open(Database.blob_store_path(digest), 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield mapped
+        else:
+            with cursor.connection.blobopen('filedata', 'data', row_id, readonly=True) as stored:
+                yield stored
+
+    @staticmethod
+    def read_blob_chunks(cursor, blob):
+        '''
+        Yields the original contents of a blob found with find_blob in pieces, decompressing if needed
+
+        Compressed and in-database blobs are read CHUNK_SIZE bytes at a time. An
+        uncompressed blob store file is yielded whole as its memory map, which
+        file.write and bytes.join take without an intermediate copy.
+        '''
+        codec = blob[1]
+        with Database.open_stored_blob(cursor, blob) as source:
+            if codec is None and isinstance(source, mmap.mmap):
+                yield source
+            else:
+                yield from blobcodecs.decompress_chunks(iter(lambda: source.read(Database.CHUNK_SIZE), b''), codec)
+
+    @staticmethod
+    def extract_file(fileID, filepath):
+        '''
+        Streams an attachment's contents to a file in CHUNK_SIZE pieces
+
+        Parameters:
+            fileID (int) : the id of the attachment
+            filepath (str) : the file to write
+
+        Returns:
+            size (int) : the number of bytes written
+        '''
+        size = 0
+        with Sql(Database.db_path) as cursor:
+            blob = Database.find_blob(fileID)
+            if blob is None:
+                raise FileNotFoundError('No data stored for attachment {}'.format(fileID))
+            with open(filepath, 'wb') as f:
+                for chunk in Database.read_blob_chunks(cursor, blob):
+                    f.write(chunk)
+                    size += len(chunk)
+        return size
+
+    @staticmethod
+    def get_data_for_file(fileID):
+        '''
+        Gets the file contents of an attachment
+
+        Parameters:
+            fileID (int) : the id of the attachment
+
+        Returns:
+            data (bytes) : the file contents, or None if nothing is stored for the attachment
+        '''
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT filedata.data, filedata.codec, filedata.id, filedata.hash, filedata.external FROM attachments
+                JOIN filedata ON filedata.hash = attachments.hash
+                WHERE attachments.id = ?
+                ''', (fileID,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute('''
+                    SELECT data, codec, id, hash, external FROM filedata
+                    WHERE fileID = ?
+                    ''', (fileID,))
+                row = cursor.fetchone()
+            if row is None:
+                return None
+            data, codec, row_id, digest, external = row
+            if external:
+                with Database.open_stored_blob(cursor, (row_id, codec, digest, external)) as source:
+                    data = source[:]
+            return blobcodecs.decompress(data, codec)
+
+    @staticmethod
+    def get_thumbnail(attachment):
+        '''
+        Gets a preview thumbnail of an attachment, making and storing it the first time
+
+        Only the thumbnails table is read once a thumbnail exists. Making one streams
+        the blob to the image library through incremental blob I/O.
+
+        Parameters:
+            attachment (Attachment) : a saved attachment
+
+        Returns:
+            thumbnail (bytes) : PNG data, or None if the attachment has no preview
+        '''
+        if attachment.hash is None:
+            return None
+        with Sql(Database.db_path) as cursor:
+            cursor.execute('''
+                SELECT data FROM thumbnails WHERE hash = ?
+                ''', (attachment.hash,))
+            row = cursor.fetchone()
+            if row is not None:
+                return row[0]
+            if not thumbnails.can_preview(attachment.mime_type):
+                # not recorded, a library that can preview it may be installed later
+                return None
+            blob = Database.find_blob(attachment.id)
+            if blob is None:
+                return None
+            if blob[1] is None:
+                with Database.open_stored_blob(cursor, blob) as source:
+                    thumbnail = thumbnails.make_thumbnail(source, attachment.mime_type)
+            else:
+                # image libraries need to seek, which compressed data does not allow
+                import tempfile
+                with tempfile.SpooledTemporaryFile(max_size=Database.SPOOL_SIZE) as source:
+                    for chunk in Database.read_blob_chunks(cursor, blob):
+                        source.write(chunk)
+                    source.seek(0)
+                    thumbnail = thumbnails.make_thumbnail(source, attachment.mime_type)
+        with Sql(Database.db_path, write=True) as cursor:
+            cursor.execute('''
+                INSERT OR REPLACE INTO thumbnails (hash, data)
+                VALUES (?, ?)
+                ''', (attachment.hash, thumbnail))
+        return thumbnail
+
+
+class TransactionPager:
+    """
+    A paged view over the transactions table
+
+    Pages are fetched with keyset pagination (WHERE id > ? LIMIT n) so moving through
+    the table costs the same on the last page as on the first. Only the rows on the
+    current page are turned into Transaction objects; the rows for the next
+    read_ahead pages are kept as raw tuples so paging forward usually needs no query.
+
+    Attributes
+    ----------
+    page_size : int
+        the number of transactions on a page
+
+    read_ahead : int
+        the number of following pages fetched along with the current one
+
+    rows : list[TransactionRow]
+        the transactions on the current page
+
+    has_next : bool
+        whether there is a page after the current one
+
+    has_previous : bool
+        whether there is a page before the current one
+
+    Methods
+    -------
+    first : None
+        loads the first page
+
+    next_page : None
+        moves to the following page
+
+    previous_page : None
+        moves to the preceding page
+
+    reload : None
+        re-reads the current page from the database
+
+    is_stale : bool
+        whether the database may have changed since the page was read
+
+    apply_insert : None
+        adds a transaction this process just wrote without re-reading the page
+
+    apply_delete : None
+        removes a transaction this process just deleted without re-reading the page
+
+    """
+    def __init__(self, page_size=50, read_ahead=1):
+        self.page_size = page_size
+        self.read_ahead = read_ahead
+        self.rows = []
+        self._after_id = 0
+        self._previous_after_ids = []
+        self._buffer = []
+        self._at_end = True
+        self._data_version = None
+
+    @property
+    def has_next(self):
+        return len(self._buffer) > 0 or not self._at_end
+
+    @property
+    def has_previous(self):
+        return len(self._previous_after_ids) > 0
+
+    @property
+    def page_number(self):
+        return len(self._previous_after_ids) + 1
+
+    def _load(self, after_id):
+        # one extra row tells us whether anything follows the read-ahead pages
+        limit = self.page_size * (1 + self.read_ahead) + 1
+        # read first, so a commit while the rows are read makes the page stale instead of being missed
+        self._data_version = Sql.get_pool(Database.db_path).data_version()
+        rows = Database.get_transaction_rows(after_id, limit)
+        self._at_end = len(rows) < limit
+        self._show(after_id, rows)
+
+    def _show(self, after_id, rows):
+        self._after_id = after_id
+        self.rows = [Database.transaction_from_row(row) for row in rows[:self.page_size]]
+        self._buffer = rows[self.page_size:]
+
+    def is_stale(self, write=None):
+        '''
+        Returns True if the database may have changed since the page was read
+
+        Parameters:
+            write (tuple) : optional, ConnectionPool.last_write() for a write made by this
+                process since, which does not count if nothing else changed
+
+        Returns:
+            stale (bool) : whether the page has to be read again
+        '''
+        current = Sql.get_pool(Database.db_path).data_version()
+        if write is None:
+            return current != self._data_version
+        before, after = write
+        return after is None or before != self._data_version or current != after
+
+    def _applied(self, write):
+        # the rows in memory now match the database as it was right after write
+        self._data_version = write[1]
+
+    def first(self):
+        self._previous_after_ids = []
+        self._load(0)
+
+    def reload(self):
+        self._load(self._after_id)
+
+    def next_page(self):
+        if not self.has_next:
+            return
+        self._previous_after_ids.append(self._after_id)
+        after_id = self.rows[-1].id
+        if len(self._buffer) > self.page_size:
+            self._show(after_id, self._buffer)
+        else:
+            self._load(after_id)
+
+    def previous_page(self):
+        if not self.has_previous:
+            return
+        self._load(self._previous_after_ids.pop())
+
+    def apply_insert(self, transaction, write):
+        '''
+        Adds a transaction written by this process to the rows held in memory
+
+        New transactions always have the highest id, so they only belong in memory
+        when the loaded rows already reach the end of the table. If anything else
+        has changed the database the page is read again instead.
+
+        Parameters:
+            transaction (Transaction) : the saved transaction, with its id set
+            write (tuple) : ConnectionPool.last_write() for the thread that saved it
+
+        Returns:
+            None
+        '''
+        if write is None or self.is_stale(write):
+            self.reload()
+            return
+        self._applied(write)
+        if not self._at_end:
+            return
+        row = (transaction.id, transaction.name, money.to_pence(transaction.amount), transaction.date, transaction.notes)
+        if len(self.rows) < self.page_size and len(self._buffer) == 0:
+            self.rows.append(Database.transaction_from_row(row))
+        else:
+            self._buffer.append(row)
+
+    def apply_delete(self, transaction_id, write):
+        '''
+        Removes a transaction deleted by this process from the rows held in memory
+
+        Parameters:
+            transaction_id (int) : the id of the deleted transaction
+            write (tuple) : ConnectionPool.last_write() for the thread that deleted it
+
+        Returns:
+            None
+        '''
+        if write is None or self.is_stale(write):
+            self.reload()
+            return
+        self._applied(write)
+        for index, transaction in enumerate(self.rows):
+            if transaction.id == transaction_id:
+                del self.rows[index]
+                if len(self._buffer) > 0:
+                    self.rows.append(Database.transaction_from_row(self._buffer.pop(0)))
+                elif not self._at_end:
+                    self.reload()
+                return
+        self._buffer = [row for row in self._buffer if row[0] != transaction_id]
+
+
+class Transaction:
+    """
+    A class to represent a credit card transaction
+
+    Attributes
+    ----------
+    id : int
+        The id of the transaction
+
+    name : str
+        name of the person who made the transaction
+
+    amount : Decimal
+        the amount of money associated with the transaction, in pounds
+        (stored in the database as whole pence)
+
+    date : str
+        the date of the transaction
+
+    attachments : list[attachment]
+        Any files associated with the transaction (e.g. receipt scans)
+
+    notes : str
+        Any commentary associated with the transaction
+
+    Methods
+    ------
+    overridden str():
+        returns a string representing the transaction in the form name, amount, date
+        used to premit representation of the object in pysimplegui listbox        
+    """
+
+    def __init__(self):
+        self.id = None
+        self.name = ''
+        self.amount = 0
+        self.date = ''
+        self.attachments = []
+        self.notes = ''
+
+    def __str__(self):
+        return 'Name: {} ; £{} ; Date: {}'.format(self.name, self.amount, self.date)
+
+
+_NOT_DECODED = object()  # TransactionRow._amount before the pence have been converted
+
+
+class TransactionRow:
+    """
+    A compact Transaction built from a row of the transactions table
+
+    Used for everything read in bulk (listings, search results, the pager). It has
+    the same public attributes and str() as Transaction, but uses __slots__ instead
+    of a __dict__, keeps the amount as the stored pence until it is first read,
+    and only creates the attachments list if it is asked for. See
+    benchmarks/transaction_rows.py for the memory and time saved.
+
+    Attributes
+    ----------
+    id, name, date, notes
+        as Transaction
+
+    amount : Decimal
+        the amount in pounds, converted from pence on first access
+
+    pence : int
+        the amount as stored
+
+    attachments : list[Attachment]
+        empty unless filled in by Database.add_attachments_to_transaction
+    """
+    __slots__ = ('id', 'name', 'pence', 'date', 'notes', '_amount', '_attachments')
+
+    def __init__(self, row):
+        self.id, self.name, self.pence, self.date, self.notes = row
+        self._amount = _NOT_DECODED
+        self._attachments = None
+
+    @property
+    def amount(self):
+        if self._amount is _NOT_DECODED:
+            self._amount = money.from_pence(self.pence)
+        return self._amount
+
+    @amount.setter
+    def amount(self, value):
+        self._amount = value
+        self.pence = money.to_pence(value)
+
+    @property
+    def attachments(self):
+        if self._attachments is None:
+            self._attachments = []
+        return self._attachments
+
+    @attachments.setter
+    def attachments(self, value):
+        self._attachments = value
+
+    def __str__(self):
+        return 'Name: {} ; £{} ; Date: {}'.format(self.name, self.amount, self.date)
+
+
+class Attachment:
+    '''
+    A class to represent a file attached to a transaction
+
+    Attachments read from the database are built from their attachments row alone
+    (see COLUMNS and from_row); the file contents are only read when data or
+    extract is used.
+    
+        Attributes
+        ----------
+        id : int
+            the id of the file
+
+        transaction_id : int
+            the id of the transaction the file is attached to
+
+        name : str
+            name of the file
+
+        path : str
+            path to the file
+
+        filetype : str
+            the type of file (e.g. image, pdf, etc.)
+
+        hash : str
+            SHA-256 hex digest of the file contents, used as the key of its blob
+
+        size : int
+            the size of the file in bytes
+
+        mime_type : str
+            the MIME type of the file, e.g. application/pdf
+
+        created_at : str
+            when the file was attached, ISO-8601 UTC (None for files attached before this was recorded)
+
+        data : bytes
+            the contents of the file, read from the database on first access and kept
+
+        Methods
+        ------
+        overridden str():
+            returns a string representing the attachment in the form name (size, type, date added)
+
+        from_row(row):
+            builds an attachment from a row of COLUMNS
+
+        from_paths(paths):
+            builds an attachment for each file, and each file inside each folder, of a list of paths
+
+        metadata_row():
+            the attachment's values for COLUMNS
+
+        extract():
+            returns the path of a temporary copy of the file
+
+        thumbnail():
+            returns a small PNG preview of the file
+
+        file_to_blob(file):
+            yields a file's data in chunks
+
+        blob_to_file(blob, name, ):
+            converts a blob data to a file
+
+        parse_filename():
+            sets name and filetype from the file path
+
+        
+    '''
+    COLUMNS = 'id, transaction_id, name, filepath, hash, size, mime_type, created_at'
+    _FILENAME = re.compile(r'(?P<filename>[^\\/]*?)(?:\.(?P<filetype>[^.\\/]*))?$')
+
+    def __init__(self, *args, **kwargs):
+        self.id = None
+        self.transaction_id = None
+        self.name = ''
+        self.filepath = ''
+        self.filetype = ''
+        self.hash = None
+        self.size = None
+        self.mime_type = None
+        self.created_at = None
+        self._data = None
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+        if self.name == '' or self.filetype == '':
+            self.parse_filename()
+        # id stays None until the attachment is saved; Database assigns it on insert
+
+    @staticmethod
+    def from_row(row):
+        '''
+        Builds an attachment from a (id, transaction_id, name, filepath, hash, size, mime_type, created_at) row
+        '''
+        return Attachment(**dict(zip(Attachment.COLUMNS.split(', '), row)))
+
+    @staticmethod
+    def from_paths(paths):
+        '''
+        Builds an attachment for each file in paths, and for each file inside the folders in paths
+
+        Folders are walked recursively in name order; hidden files and folders are skipped.
+        '''
+        attachments = []
+        for path in paths:
+            if not os.path.isdir(path):
+                attachments.append(Attachment(filepath=path))
+                continue
+            for folder, folders, files in os.walk(path):
+                folders[:] = sorted(name for name in folders if not name.startswith('.'))
+                for name in sorted(files):
+                    if not name.startswith('.'):
+                        attachments.append(Attachment(filepath=os.path.join(folder, name)))
+        return attachments
+
+    def metadata_row(self):
+        '''
+        Returns the attachment's values in the order of COLUMNS
+        '''
+        return (self.id, self.transaction_id, self.name, self.filepath, self.hash,
+                self.size, self.mime_type, self.created_at)
+
+    def __str__(self):
+        details = [filetypes.format_size(self.size), self.mime_type]
+        if self.created_at:
+            details.append('added ' + self.created_at[:10])
+        details = [detail for detail in details if detail]
+        if len(details) == 0:
+            return '{} {}'.format(self.name, self.filepath)
+        return '{} ({})'.format(self.name, ', '.join(details))
+
+    @property
+    def data(self):
+        '''
+        The contents of the file, read from the database the first time they are used
+        '''
+        if self._data is None and self.id is not None:
+            self._data = Database.get_data_for_file(self.id)
+        return self._data
+
+    def extract(self):
+        '''
+        Returns the path of a temporary copy of the file, see FileOperations.extract_attachment
+        '''
+        return FileOperations.extract_attachment(self)
+
+    def thumbnail(self):
+        '''
+        Returns a PNG preview of the file, or None if it has none, see Database.get_thumbnail
+        '''
+        return Database.get_thumbnail(self)
+
+    def file_to_blob(self, file, chunk_size=None):
+        '''
+        yields a file's data in chunks of at most chunk_size bytes (Database.CHUNK_SIZE by default)
+        '''
+        with open(file, 'rb') as f:
+            yield from iter(lambda: f.read(chunk_size or Database.CHUNK_SIZE), b'')
+
+    def blob_to_file(self, blob, name):
+        '''
+        converts a blob data to a file
+        '''
+        with open(name, 'wb') as f:
+            f.write(blob)
+
+    def parse_filename(self):
+        '''
+        parses the filename of the file
+        '''
+        match = Attachment._FILENAME.search(self.filepath or '')
+        if self.name == '':
+            self.name = match.group('filename')
+        if self.filetype == '':
+            self.filetype = match.group('filetype') or ''
@@ -0,0 +1,76 @@
+'''
+Date handling shared by the GUI, importer and database layer
+
+Transactions keep the date as it was entered (transactions.date) for display, and
+an ISO-8601 YYYY-MM-DD copy (transactions.iso_date) that sorts correctly and is
+indexed for range queries.
+'''
+from datetime import date as Date, datetime
+
+DISPLAY_FORMAT = '%d-%m-%Y'  # the format the New Expense tab's date picker writes
+INPUT_FORMATS = ['%d-%m-%Y', '%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y', '%d %b %Y', '%d %B %Y', '%d.%m.%Y', '%m/%d/%Y']
+
+
+def parse(text):
+    '''
+    Parses a date in any of INPUT_FORMATS, or an OFX YYYYMMDD[hhmmss...] timestamp
+
+    Returns:
+        date (datetime.date) : the date, or None if the text is not a recognised date
+    '''
+    text = (text or '').strip()
+    if len(text) >= 8 and text[:8].isdigit():
+        formats, text = ['%Y%m%d'], text[:8]
+    else:
+        formats = INPUT_FORMATS
+    for date_format in formats:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    return None
+
+
+def to_iso(text):
+    '''
+    Converts an entered date to YYYY-MM-DD
+
+    dd-mm-yyyy and yyyy-mm-dd, the formats the programme itself writes, are
+    rearranged without calling strptime so bulk inserts stay fast. Dates that
+    do not exist, such as 31-02-2023, are not recognised.
+
+    Returns:
+        iso_date (str) : the date as YYYY-MM-DD, or None if the text is not a recognised date
+    '''
+    if text is None:
+        return None
+    text = str(text).strip()
+    if len(text) == 10 and text[2] == '-' and text[5] == '-' and (text[:2] + text[3:5] + text[6:]).isdigit():
+        if _exists(int(text[6:]), int(text[3:5]), int(text[:2])):
+            return text[6:] + '-' + text[3:5] + '-' + text[:2]
+        return None
+    if len(text) == 10 and text[4] == '-' and text[7] == '-' and (text[:4] + text[5:7] + text[8:]).isdigit():
+        if _exists(int(text[:4]), int(text[5:7]), int(text[8:])):
+            return text
+        return None
+    date = parse(text)
+    return date.isoformat() if date is not None else None
+
+
+def _exists(year, month, day):
+    try:
+        Date(year, month, day)
+    except ValueError:
+        return False
+    return True
+
+
+def to_display(text):
+    '''
+    Converts an entered date to DISPLAY_FORMAT
+
+    Returns:
+        date (str) : the date as dd-mm-yyyy, or None if the text is not a recognised date
+    '''
+    date = parse(text)
+    return date.strftime(DISPLAY_FORMAT) if date is not None else None
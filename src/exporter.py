@@ -0,0 +1,130 @@
+'''
+Exports transactions from the expenses database as CSV or JSON Lines
+
+Rows are streamed from Database.iter_transaction_batches straight to the output,
+so memory use stays flat however many transactions are exported. Date and name
+filters are applied by SQLite rather than in Python.
+
+Usage:
+    python exporter.py [--format csv|jsonl] [--from YYYY-MM-DD] [--to YYYY-MM-DD]
+                       [--name NAME] [--output FILE] [--db path/to/expenses.db]
+'''
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+import money
+from core import Database
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['id', 'name', 'amount', 'date', 'notes']
+FORMATS = ['csv', 'jsonl']
+
+
+def write_csv(batches, out):
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    count = 0
+    for rows in batches:
+        writer.writerows((row[0], row[1], money.from_pence(row[2]), row[3], row[4]) for row in rows)
+        count += len(rows)
+    return count
+
+
+def write_jsonl(batches, out):
+    count = 0
+    for rows in batches:
+        lines = []
+        for row_id, name, pence, date, notes in rows:
+            amount = money.from_pence(pence)
+            record = {'id': row_id, 'name': name, 'amount': float(amount) if amount is not None else None,
+                      'date': date, 'notes': notes}
+            lines.append(json.dumps(record, ensure_ascii=False) + '\n')
+        out.write(''.join(lines))
+        count += len(rows)
+    return count
+
+
+def _reporting(batches, progress):
+    count = 0
+    for rows in batches:
+        yield rows
+        count += len(rows)
+        progress(count)
+
+
+def export(out, file_format='csv', start_date=None, end_date=None, name=None, batch_size=1000, progress=None):
+    '''
+    Writes the matching transactions to an open text file
+
+    Parameters:
+        out (file) : where to write, e.g. an open file or sys.stdout
+        file_format (str) : 'csv' or 'jsonl'
+        start_date (str) : optional, earliest date to include, YYYY-MM-DD
+        end_date (str) : optional, latest date to include, YYYY-MM-DD
+        name (str) : optional, only export transactions made by this person
+        batch_size (int) : the number of rows fetched from the database at a time
+        progress (callable) : optional, called as progress(rows_written) after each batch
+
+    Returns:
+        count (int) : the number of transactions written
+    '''
+    if file_format not in FORMATS:
+        raise ValueError('Unknown export format {!r}, expected one of {}'.format(file_format, FORMATS))
+    start = time.perf_counter()
+    batches = Database.iter_transaction_batches(start_date, end_date, name, batch_size)
+    if progress is not None:
+        batches = _reporting(batches, progress)
+    if file_format == 'jsonl':
+        count = write_jsonl(batches, out)
+    else:
+        count = write_csv(batches, out)
+    logger.info('Exported %d transaction(s) in %.2fs', count, time.perf_counter() - start)
+    return count
+
+
+def export_file(filepath, file_format=None, **filters):
+    '''
+    Exports to a file, choosing the format from the extension if none is given
+
+    Returns:
+        count (int) : the number of transactions written
+    '''
+    if file_format is None:
+        file_format = 'jsonl' if os.path.splitext(filepath)[1].lower() in ('.jsonl', '.json') else 'csv'
+    try:
+        with open(filepath, 'w', encoding='utf-8', newline='') as out:
+            return export(out, file_format, **filters)
+    except BaseException:
+        # don't leave half an export behind, e.g. when cancelled from the GUI
+        os.remove(filepath)
+        raise
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export transactions from the expenses database')
+    parser.add_argument('--format', choices=FORMATS, help='output format (defaults to the output extension, or csv)')
+    parser.add_argument('--from', dest='start_date', help='earliest date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='end_date', help='latest date, YYYY-MM-DD')
+    parser.add_argument('--name', help='only transactions made by this person')
+    parser.add_argument('--output', '-o', help='file to write (defaults to stdout)')
+    parser.add_argument('--db', help='database file (defaults to the one in config.ini)')
+    args = parser.parse_args(argv)
+
+    Database.configure(args.db)
+    Database.prepare_tables()
+    filters = dict(start_date=args.start_date, end_date=args.end_date, name=args.name)
+    if args.output is None:
+        export(sys.stdout, args.format or 'csv', **filters)
+    else:
+        count = export_file(args.output, args.format, **filters)
+        print('Exported {} transaction(s) to {}'.format(count, args.output), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+'''
+File type detection shared by attachment ingest and the database migrations
+
+The MIME type of an attachment is worked out once, when it is stored, from the
+first few bytes of the file (so a receipt saved without an extension is still
+recognised) and otherwise from its name.
+'''
+
+HEAD_SIZE = 16  # the number of leading bytes sniff needs
+
+# leading bytes of the file formats receipts usually arrive in
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'BM', 'image/bmp'),
+]
+
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+
+
+def sniff(head):
+    '''
+    Returns the MIME type the leading bytes of a file identify, or None if they are not recognised
+    '''
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime_type in SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    return None
+
+
+def guess_mime_type(name, head=b''):
+    '''
+    Works out the MIME type of a file
+
+    Parameters:
+        name (str) : the file name or path, used if the contents are not recognised
+        head (bytes) : optional, the first HEAD_SIZE bytes of the file
+
+    Returns:
+        mime_type (str) : the MIME type, DEFAULT_MIME_TYPE if it cannot be told
+    '''
+    # imported here as it is only needed when a file is attached, not at startup
+    import mimetypes
+    return sniff(head) or mimetypes.guess_type(name or '')[0] or DEFAULT_MIME_TYPE
+
+
+def mime_type_of_file(filepath):
+    '''
+    Returns the MIME type of a file on disk, reading only its first HEAD_SIZE bytes
+    '''
+    with open(filepath, 'rb') as f:
+        return guess_mime_type(filepath, f.read(HEAD_SIZE))
+
+
+def format_size(size):
+    '''
+    Formats a size in bytes for display, e.g. "512 bytes", "1.2 MB"
+
+    Returns:
+        text (str) : the formatted size, or '' if size is None
+    '''
+    if size is None:
+        return ''
+    if size < 1024:
+        return '{} bytes'.format(size)
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return '{:.1f} {}'.format(size, unit)
@@ -1 +1,5 @@
-SIZE_LHS = (20,)
\ No newline at end of file
+SIZE_LHS = (20,)
+PAGE_SIZE = 25
+READ_AHEAD_PAGES = 2
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_LIMIT = 200
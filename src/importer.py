@@ -0,0 +1,277 @@
+'''
+Imports credit card statements (CSV or OFX) into the expenses database
+
+Statements are read as a stream: rows are parsed and validated one at a time by
+generators and handed to Database.add_transactions, which writes them in batches
+inside one database transaction per file. Memory use does not depend on the size
+of the file.
+
+Usage:
+    python importer.py statement.csv [more files...] [--db path/to/expenses.db]
+'''
+import argparse
+import csv
+import io
+import logging
+import os
+import time
+
+import dates
+import money
+from core import Database, Transaction
+
+logger = logging.getLogger(__name__)
+
+# lower-case CSV header names recognised for each transaction field
+CSV_COLUMNS = {
+    'name': ['name', 'cardholder', 'card holder', 'card member', 'cardmember'],
+    'amount': ['amount', 'value', 'debit', 'amount (gbp)', 'billing amount'],
+    'date': ['date', 'transaction date', 'posted date', 'posting date'],
+    'notes': ['description', 'notes', 'merchant', 'payee', 'memo', 'reference', 'details'],
+}
+
+
+class StatementError(ValueError):
+    '''
+    Raised for a statement row that cannot be turned into a transaction
+    '''
+
+
+class ImportReport:
+    """
+    Summary of one imported statement file
+
+    Attributes
+    ----------
+    filepath : str
+        the file that was imported
+
+    imported : int
+        the number of transactions written
+
+    rejected : int
+        the number of rows that failed validation
+
+    errors : list[str]
+        the first few validation errors, for showing to the user
+
+    bytes_read : int
+        the size of the file
+
+    seconds : float
+        how long the import took
+
+    """
+    MAX_ERRORS = 20
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.bytes_read = 0
+        self.seconds = 0.0
+
+    def reject(self, where, error):
+        self.rejected += 1
+        if len(self.errors) < ImportReport.MAX_ERRORS:
+            self.errors.append('{}: {}'.format(where, error))
+
+    @property
+    def rows_per_second(self):
+        return self.imported / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes_read / 1e6 / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return '{}: {} imported, {} rejected in {:.2f}s ({:.0f} rows/s, {:.1f} MB/s)'.format(
+            os.path.basename(self.filepath), self.imported, self.rejected, self.seconds,
+            self.rows_per_second, self.megabytes_per_second)
+
+
+def parse_amount(text):
+    '''
+    Parses an amount such as "£1,234.50", "-12.00" or "(12.00)"
+
+    Returns:
+        amount (Decimal) : the amount in pounds
+    '''
+    try:
+        pence = money.to_pence(text)
+    except ValueError:
+        pence = None
+    if pence is None:
+        raise StatementError('invalid amount {!r}'.format(text))
+    return money.from_pence(pence)
+
+
+def parse_date(text):
+    '''
+    Parses a date in any of dates.INPUT_FORMATS, or an OFX YYYYMMDD[hhmmss...] timestamp
+
+    Returns:
+        date (str) : the date in dates.DISPLAY_FORMAT
+    '''
+    date = dates.to_display(text)
+    if date is None:
+        raise StatementError('invalid date {!r}'.format(text))
+    return date
+
+
+def make_transaction(name, amount, date, notes):
+    transaction = Transaction()
+    transaction.name = (name or '').strip()
+    transaction.amount = parse_amount(amount)
+    transaction.date = parse_date(date)
+    transaction.notes = (notes or '').strip()
+    return transaction
+
+
+def _find_columns(header, columns=None):
+    columns = columns or CSV_COLUMNS
+    lowered = [field.strip().lower() for field in header]
+    found = {}
+    for field, names in columns.items():
+        for name in names:
+            if name in lowered:
+                found[field] = lowered.index(name)
+                break
+    missing = [field for field in ('amount', 'date') if field not in found]
+    if missing:
+        raise StatementError('no {} column in header {}'.format(' or '.join(missing), header))
+    return found
+
+
+def read_csv(text_file, report, columns=None):
+    '''
+    Yields a Transaction for each valid row of a CSV statement with a header row
+
+    Parameters:
+        text_file (file) : the open statement
+        report (ImportReport) : invalid rows are recorded here
+        columns (dict[str, list[str]]) : optional header names per field, CSV_COLUMNS by default
+    '''
+    reader = csv.reader(text_file)
+    header = next(reader, None)
+    if header is None:
+        return
+    found = _find_columns(header, columns)
+    cell = lambda row, field: row[found[field]] if field in found and found[field] < len(row) else ''
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            yield make_transaction(cell(row, 'name'), cell(row, 'amount'), cell(row, 'date'), cell(row, 'notes'))
+        except StatementError as error:
+            report.reject('line {}'.format(reader.line_num), error)
+
+
+def _ofx_tokens(text_file, chunk_size=64 * 1024):
+    # OFX files may be SGML (unclosed tags, one per line) or XML on a single line,
+    # so split on '<' rather than on line breaks
+    pending = ''
+    for chunk in iter(lambda: text_file.read(chunk_size), ''):
+        parts = (pending + chunk).split('<')
+        pending = parts.pop()
+        for part in parts:
+            if part:
+                yield part
+    if pending:
+        yield pending
+
+
+def read_ofx(text_file, report):
+    '''
+    Yields a Transaction for each valid STMTTRN record of an OFX statement
+
+    The cardholder name is not part of OFX transactions, so NAME (the payee) is
+    stored in the notes together with MEMO.
+    '''
+    record = None
+    count = 0
+    for token in _ofx_tokens(text_file):
+        tag, _, value = token.partition('>')
+        tag = tag.strip().upper()
+        value = value.strip()
+        if tag == 'STMTTRN':
+            record = {}
+        elif tag == '/STMTTRN' and record is not None:
+            count += 1
+            notes = ' '.join(part for part in (record.get('NAME'), record.get('MEMO')) if part)
+            try:
+                yield make_transaction('', record.get('TRNAMT'), record.get('DTPOSTED'), notes)
+            except StatementError as error:
+                report.reject('transaction {}'.format(count), error)
+            record = None
+        elif record is not None and not tag.startswith('/'):
+            record[tag] = value
+
+
+def detect_format(filepath):
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension in ('.ofx', '.qfx'):
+        return 'ofx'
+    return 'csv'
+
+
+def import_file(filepath, file_format=None, batch_size=5000, progress=None, columns=None):
+    '''
+    Imports one statement file into the current database
+
+    Parameters:
+        filepath (str) : the statement to import
+        file_format (str) : 'csv' or 'ofx', guessed from the extension if None
+        batch_size (int) : the number of transactions per executemany batch
+        progress (callable) : optional, called as progress(bytes_read, total_bytes, rows_imported)
+        columns (dict[str, list[str]]) : optional CSV header names per field
+
+    Returns:
+        report (ImportReport) : what was imported
+    '''
+    file_format = file_format or detect_format(filepath)
+    report = ImportReport(filepath)
+    total = os.path.getsize(filepath)
+    start = time.perf_counter()
+    with open(filepath, 'rb') as raw:
+        text_file = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        if file_format == 'ofx':
+            transactions = read_ofx(text_file, report)
+        else:
+            transactions = read_csv(text_file, report, columns)
+        on_batch = None
+        if progress is not None:
+            on_batch = lambda rows: progress(raw.tell(), total, rows)
+        report.imported = Database.add_transactions(transactions, batch_size=batch_size, progress=on_batch)
+    report.bytes_read = total
+    report.seconds = time.perf_counter() - start
+    if progress is not None:
+        progress(total, total, report.imported)
+    logger.info('%s', report)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Import credit card statements into the expenses database')
+    parser.add_argument('files', nargs='+', help='CSV or OFX statement files')
+    parser.add_argument('--db', help='database file (defaults to the one in config.ini)')
+    parser.add_argument('--format', choices=['csv', 'ofx'], help='file format (defaults to the file extension)')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    Database.configure(args.db)
+    Database.prepare_tables()
+    for filepath in args.files:
+        try:
+            report = import_file(filepath, args.format, args.batch_size)
+        except StatementError as error:
+            print('{}: {}'.format(filepath, error))
+            continue
+        print(report)
+        for error in report.errors:
+            print('  ' + error)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,23 @@
-from select import select
 import PySimpleGUI as sg
 import sys
-from classes import Transaction, select_db_window, Database, Sql, view_transaction_window, choose_attachment_window, FileOperations
+from core import Transaction, TransactionPager, Database, Sql, FileOperations
+from classes import select_db_window, view_transaction_window, choose_attachment_window
 from global_constants import *
 import configparser
 import os
 import atexit
+import datetime
+import time
+import importer
+import dates
+import money
+import exporter
+from worker import Worker, JobCancelled
 
 
 cfg_path = os.path.join(os.path.dirname(__file__), 'config.ini')
 atexit.register(FileOperations.delete_temp_dir)
+atexit.register(Sql.close_all)
 
 
 
@@ -20,12 +28,22 @@ class MainWindow:
         print(self._config_parser.sections())
         self.db_path = self._config_parser['DATABASE']['db_path']
         Database.db_path = self.db_path
+        # 0 keeps every attachment inside the database
+        Database.EXTERNAL_THRESHOLD = self._config_parser.getint(
+            'ATTACHMENTS', 'external_threshold', fallback=Database.EXTERNAL_THRESHOLD) or None
+        Database.JOURNAL_MODE = self._config_parser.get('DATABASE', 'journal_mode', fallback='wal') or None
         self.temp_attachments = []
         self.transactions = []
-        self.menu_def = [['&File', ['&Open database...::open_db_key']],]
+        self.pager = TransactionPager(page_size=PAGE_SIZE, read_ahead=READ_AHEAD_PAGES)
+        self.search_text = ''
+        self._search_due = None
+        self._page = ([], 1, False, False)
+        self._cancel_key = lambda values: self.cancel_job()
+        self.menu_def = [['&File', ['&Open database...::open_db_key', '&Import statement...::import_key', '&Export...::export_key', '&Compact database::compact_db_key']],]
         self.tab1_layout = [
-            [sg.Text('Expenses')],
-            [sg.Listbox(values=[], key='expenses', size=(50, 25))],
+            [sg.Text('Expenses'), sg.Push(), sg.Text('Search'), sg.InputText(key='search', size=(25, 1), enable_events=True)],
+            [sg.Listbox(values=[], key='expenses', size=(50, PAGE_SIZE))],
+            [sg.Button('< Prev', key=lambda values: self.previous_page_callback()), sg.Text('Page 1', key='page'), sg.Button('Next >', key=lambda values: self.next_page_callback())],
             [sg.Button('View', key=lambda values: self.view_transaction()), sg.Button('Delete', key=lambda values: self.delete_button_callback())]
         ]
         self.tab2_layout = [
@@ -39,18 +57,133 @@ class MainWindow:
             [sg.Button('Add', key=lambda values: self.add_transaction_callback())],
             [sg.Button('Clear', key=lambda values: print(values))]
         ]
+        self.tab3_layout = [
+            [sg.Text('Year', size=SIZE_LHS), sg.InputText(str(datetime.date.today().year), key='report_year', size=(6, 1)),
+             sg.Checkbox('By month', key='report_by_month'), sg.Button('Show', key=lambda values: self.show_report())],
+            [sg.Table(values=[], headings=['Month', 'Name', 'Total', 'Count'], key='report', auto_size_columns=False,
+                      col_widths=[8, 25, 10, 6], num_rows=20)]
+        ]
         self.layout = [
             [sg.Menu(self.menu_def)],
-            [sg.TabGroup([[sg.Tab('View Expenses', self.tab1_layout), sg.Tab('New Expense', self.tab2_layout)]], background_color='black')],
+            [sg.TabGroup([[sg.Tab('View Expenses', self.tab1_layout), sg.Tab('New Expense', self.tab2_layout), sg.Tab('Reports', self.tab3_layout)]], background_color='black')],
+            [sg.Text('', key='status', size=(45, 1)), sg.ProgressBar(100, orientation='h', size=(20, 12), key='progress', visible=False),
+             sg.Button('Cancel', key=self._cancel_key, visible=False)],
             [sg.Button('Add test transaction', key=lambda values: self.add_test_transaction(values)), sg.Button('Exit')]
         ]
         
         self.window = sg.Window('Expense Tracker', self.layout)
         self.window.Finalize()
+        # writes and long jobs run one at a time on jobs; page loads, searches and reports on reads.
+        # The pager is only ever used on the reads thread.
+        self.jobs = Worker(self.window, 'database jobs', on_error=self.show_error)
+        self.reads = Worker(self.window, 'database reads', on_error=self.show_error)
+
+    def show_error(self, error):
+        sg.Popup('Something went wrong: {}'.format(error))
+
+    def run_job(self, func, *args, description='', on_done=None, cancellable=False, **kwargs):
+        '''
+        Runs func(job, *args, **kwargs) on the jobs worker and shows the busy indicator until it is done
+        '''
+        job = self.jobs.submit(func, *args, description=description, on_done=on_done, cancellable=cancellable, **kwargs)
+        self.window['status'].update(description + '...')
+        self.window[self._cancel_key].update(visible=cancellable)
+        return job
+
+    def show_progress(self, value):
+        job, done, total, text = value
+        self.window['status'].update('{} {}'.format(job.description, text).strip())
+        if total > 0:
+            self.window['progress'].update(current_count=done, max=total, visible=True)
+        self.window[self._cancel_key].update(visible=job.cancellable)
+
+    def job_finished(self):
+        if not self.jobs.busy:
+            self.window['status'].update('')
+            self.window['progress'].update(current_count=0, visible=False)
+            self.window[self._cancel_key].update(visible=False)
+
+    def cancel_job(self):
+        job = self.jobs.current
+        if job is not None and job.cancellable:
+            job.cancel()
+            self.window['status'].update('Cancelling {}...'.format(job.description.lower()))
+
+    def page(self, action, *args):
+        '''
+        Runs a TransactionPager method on the reads worker and shows the resulting page
+        '''
+        self.reads.submit(self._page_job, action, *args, description='Loading transactions', on_done=self.show_page)
+
+    def _page_job(self, job, action, *args):
+        getattr(self.pager, action)(*args)
+        if len(self.pager.rows) == 0 and self.pager.has_previous:
+            self.pager.previous_page()
+        return list(self.pager.rows), self.pager.page_number, self.pager.has_previous, self.pager.has_next
+
+    def show_page(self, page):
+        self._page = page
+        self.render_transactions()
 
     def update_transactions(self):
-        self.transactions = Database.get_all_transactions()
+        self.page('reload')
+
+    def render_transactions(self):
+        if self.search_text:
+            self.window['search'].update('')
+            self.search_text = ''
+        rows, page_number, _, _ = self._page
+        self.transactions = rows
         self.window['expenses'].update(values=self.transactions)
+        self.window['page'].update('Page {}'.format(page_number))
+
+    def search_changed(self):
+        # wait until typing pauses before querying
+        self._search_due = time.monotonic() + SEARCH_DEBOUNCE_MS / 1000
+
+    def run_search(self):
+        self._search_due = None
+        text = self.values['search'].strip()
+        if Database.db_path in ['', None]:
+            return
+        if text == '':
+            self.render_transactions()
+            return
+        self.search_text = text
+        self.reads.submit(lambda job: Database.search(text, SEARCH_LIMIT), description='Searching',
+                          on_done=lambda rows: self.show_search_results(text, rows))
+
+    def show_search_results(self, text, rows):
+        if text != self.search_text:
+            # the search box has changed since, a newer search is on its way
+            return
+        self.transactions = rows
+        self.window['expenses'].update(values=self.transactions)
+        self.window['page'].update('{} match(es)'.format(len(self.transactions)))
+
+    def first_page(self):
+        self.page('first')
+
+    def open_database(self):
+        '''
+        Creates or upgrades the tables of Database.db_path on the jobs worker, then shows its first page
+
+        Upgrading an old database can rewrite every row and hash every attachment.
+        '''
+        self._page = ([], 1, False, False)
+        self.window['expenses'].update(values=[])
+        self.run_job(lambda job: Database.prepare_tables(), description='Opening database',
+                     on_done=lambda result: self.first_page())
+
+    def next_page_callback(self, *args, **kwargs):
+        if Database.db_path in ['', None] or self.search_text or not self._page[3]:
+            return
+        self.page('next_page')
+
+    def previous_page_callback(self, *args, **kwargs):
+        if Database.db_path in ['', None] or self.search_text or not self._page[2]:
+            return
+        self.page('previous_page')
 
     def update_temp_attachments(self):
         self.window['attachments'].update(values=self.temp_attachments)
@@ -61,11 +194,11 @@ class MainWindow:
             return
         test_transaction = Transaction()
         test_transaction.amount = 100
-        test_transaction.date = '2020-01-01'
+        test_transaction.date = '01-01-2020'
         test_transaction.name = 'test'
         test_transaction.notes = 'test'
-        Database.add_transaction(test_transaction)
-        self.update_transactions()
+        self.run_job(self._add_transaction_job, test_transaction, description='Adding transaction',
+                     on_done=lambda write: self.page('apply_insert', test_transaction, write))
 
     def choose_attachment(self, *args, **kwargs):
         w = choose_attachment_window(self)
@@ -98,53 +231,184 @@ class MainWindow:
             sg.Popup('Please select a transaction')
             return
         selected_transaction : Transaction = self.values['expenses'][0]
-        Database.delete_transaction(selected_transaction.id)
-        self.update_transactions()
+        self.run_job(self._delete_transaction_job, selected_transaction.id, description='Deleting transaction',
+                     on_done=lambda write: self.page('apply_delete', selected_transaction.id, write))
+
+    def _delete_transaction_job(self, job, transaction_id):
+        Database.delete_transaction(transaction_id)
+        return Sql.get_pool(Database.db_path).last_write()
 
     def add_transaction_callback(self, *args, **kwargs):
         if Database.db_path in ['', None]:
             sg.Popup('Please open a database first')
             return
+        date = dates.to_display(self.values['date'])
+        if date is None:
+            sg.Popup('Please enter a valid date')
+            return
+        try:
+            pence = money.to_pence(self.values['amount'])
+        except ValueError:
+            pence = None
+        if pence is None:
+            sg.Popup('Please enter a valid amount')
+            return
         transaction = Transaction()
-        transaction.amount = self.values['amount']
-        transaction.date = self.values['date']
+        transaction.amount = money.from_pence(pence)
+        transaction.date = date
         transaction.name = self.values['name']
         transaction.notes = self.values['notes']
-        transaction.attachments = self.temp_attachments
-        Database.add_transaction(transaction)
-        self.update_transactions()
+        transaction.attachments = list(self.temp_attachments)
+        self.run_job(self._add_transaction_job, transaction, description='Saving transaction',
+                     on_done=lambda write: self.transaction_added(transaction, write), cancellable=True)
+
+    def _add_transaction_job(self, job, transaction):
+        # returns the write's data_versions, which let the pager add the row without re-reading the page
+        numbers = {id(attachment): number for number, attachment in enumerate(transaction.attachments, 1)}
+        count = len(numbers)
+        progress = lambda attachment, bytes_written, total_bytes: job.report(
+            bytes_written, total_bytes, '{} ({} of {})'.format(attachment.name, numbers[id(attachment)], count))
+        Database.add_transaction(transaction, progress=progress)
+        return Sql.get_pool(Database.db_path).last_write()
+
+    def transaction_added(self, transaction, write):
+        self.page('apply_insert', transaction, write)
         self.temp_attachments = []
         self.update_temp_attachments()  
         self.window['name'].update('')
         self.window['amount'].update('')
         self.window['date'].update('')
         self.window['notes'].update('')
-        
 
+    def import_statements(self):
+        if Database.db_path in ['', None]:
+            sg.Popup('Please open a database first')
+            return
+        files = sg.popup_get_file('Select statement files', multiple_files=True,
+                                  file_types=(('Statements', '*.csv *.ofx *.qfx'), ('All files', '*.*')))
+        if not files:
+            return
+        self.run_job(self._import_job, files.split(';'), description='Importing', on_done=self.statements_imported, cancellable=True)
+
+    def _import_job(self, job, filepaths):
+        # each file is imported in its own transaction, so files finished before a cancel are kept
+        reports = []
+        for filepath in filepaths:
+            name = os.path.basename(filepath)
+            progress = lambda done, total, rows: job.report(done, total, '{} ({} rows)'.format(name, rows))
+            try:
+                reports.append(importer.import_file(filepath, progress=progress))
+            except importer.StatementError as error:
+                reports.append('{}: {}'.format(name, error))
+            except JobCancelled:
+                reports.append('{}: cancelled, nothing imported'.format(name))
+                break
+        return reports
+
+    def statements_imported(self, reports):
+        self.update_transactions()
+        sg.Popup('\n'.join(str(report) for report in reports))
+
+    def export_transactions(self):
+        if Database.db_path in ['', None]:
+            sg.Popup('Please open a database first')
+            return
+        filepath = sg.popup_get_file('Export transactions to', save_as=True, default_extension='.csv',
+                                     file_types=(('CSV', '*.csv'), ('JSON Lines', '*.jsonl')))
+        if not filepath:
+            return
+        progress = lambda job, rows: job.report(rows, 0, '{} rows'.format(rows))
+        self.run_job(lambda job: exporter.export_file(filepath, progress=lambda rows: progress(job, rows)),
+                     description='Exporting', cancellable=True,
+                     on_done=lambda count: sg.Popup('Exported {} transaction(s)'.format(count)))
+
+    def show_report(self):
+        if Database.db_path in ['', None]:
+            sg.Popup('Please open a database first')
+            return
+        year = self.values['report_year'].strip()
+        if not year.isdigit():
+            sg.Popup('Please enter a year')
+            return
+        by_month = self.values['report_by_month']
+        self.reads.submit(lambda job: Database.get_year_summary(int(year), by_month=by_month), description='Loading report',
+                          on_done=self.render_report)
+
+    def compact_database(self, incremental):
+        '''
+        Deletes unused attachment data and returns the free space to the filesystem
+
+        Databases created before auto_vacuum=INCREMENTAL was used can only give space
+        back after a one-time full VACUUM, which is offered first.
+        '''
+        enable = False
+        if not incremental:
+            enable = sg.popup_yes_no('This database can only return free space to the disk after a one-time rebuild.\n'
+                                     'The rebuild rewrites the whole file and can take a while on a large database; '
+                                     'other copies of the programme cannot save while it runs.\n\n'
+                                     'Rebuild it now?', title='Compact database') == 'Yes'
+        self.run_job(self._compact_job, enable, description='Compacting database',
+                     on_done=lambda result: sg.Popup('Removed {} unused attachment file(s), freed {} page(s)'.format(*result)))
 
+    def _compact_job(self, job, enable_incremental_vacuum):
+        deleted, freed = Database.compact()
+        if enable_incremental_vacuum:
+            freed += Database.enable_incremental_vacuum()
+        return deleted, freed
 
+    def render_report(self, rows):
+        self.window['report'].update(values=[[month or '', name, '{:.2f}'.format(total or 0), count] for month, name, total, count in rows])
 
     def start(self):
         if self.db_path not in ['', None]:
-            self.update_transactions()
+            self.open_database()
         while True:
-            event, values = self.window.read()
+            timeout = None
+            if self._search_due is not None:
+                timeout = max(0, int((self._search_due - time.monotonic()) * 1000))
+            event, values = self.window.read(timeout=timeout)
             self.event, self.values = event, values #hack becuase I need to refactor
             if event == 'Exit':
                 break
+            elif event == Worker.EVENT:
+                Worker.dispatch(values[event])
+                self.job_finished()
+            elif event == Worker.PROGRESS_EVENT:
+                self.show_progress(values[event])
+            elif event == 'search':
+                self.search_changed()
+            elif event == sg.TIMEOUT_KEY:
+                if self._search_due is not None and time.monotonic() >= self._search_due:
+                    self.run_search()
             elif not callable(event) and event != None and 'open_db_key' in event :
+                if self.jobs.busy or self.reads.busy:
+                    sg.Popup('Please wait for the current job to finish, or cancel it')
+                    continue
                 self.window.Hide()
                 w = select_db_window(self)
                 w.run()
                 self._config_parser['DATABASE']['db_path'] = Database.db_path
                 with open(cfg_path, 'w') as configfile:
                     self._config_parser.write(configfile)
-                self.update_transactions()
-                self.window.UnHide()                
+                self.window.UnHide()
+                if Database.db_path not in ['', None]:
+                    self.open_database()                
+            elif not callable(event) and event != None and 'import_key' in event:
+                self.import_statements()
+            elif not callable(event) and event != None and 'export_key' in event:
+                self.export_transactions()
+            elif not callable(event) and event != None and 'compact_db_key' in event:
+                if Database.db_path in ['', None]:
+                    sg.Popup('Please open a database first')
+                    continue
+                self.reads.submit(lambda job: Database.incremental_vacuum_enabled(), description='Checking database',
+                                  on_done=self.compact_database)
             elif event == sg.WIN_CLOSED:
                 break
             elif callable(event):
                 event(values)
+        self.jobs.stop()
+        self.reads.stop()
 
     def dance(self):
         print('dance')
@@ -0,0 +1,662 @@
+'''
+Schema migrations for the expenses database
+
+The schema version is stored in PRAGMA user_version. Each function in MIGRATIONS
+upgrades the schema by one version and runs in its own write transaction, so a database
+is never left half way between two versions. To change the schema append a new
+function to MIGRATIONS; never edit one that has already shipped.
+'''
+import hashlib
+import logging
+
+import dates
+import filetypes
+import money
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(cursor, table, columns):
+    cursor.execute('PRAGMA table_info({})'.format(table))
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, declaration in columns.items():
+        if name not in existing:
+            cursor.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(table, name, declaration))
+
+
+def create_base_tables(cursor):
+    '''
+    Version 1: the original three tables plus content addressed blob columns
+
+    Also brings databases created before user_version was tracked up to the same shape.
+    '''
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            amount NUMBER,
+            date TEXT,
+            notes TEXT
+            )
+            '''
+    )
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY,
+            transaction_id INTEGER,
+            name TEXT,
+            filepath TEXT,
+            hash TEXT
+            )'''
+    )
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS filedata (
+            id INTEGER PRIMARY KEY,
+            fileID INTEGER,
+            data BLOB,
+            hash TEXT,
+            refcount INTEGER NOT NULL DEFAULT 0
+            )'''
+    )
+    _add_missing_columns(cursor, 'attachments', {'hash': 'TEXT'})
+    _add_missing_columns(cursor, 'filedata', {'hash': 'TEXT', 'refcount': 'INTEGER NOT NULL DEFAULT 0'})
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS filedata_hash ON filedata (hash)
+        '''
+    )
+
+
+def deduplicate_filedata(cursor):
+    '''
+    Version 2: converts blobs stored one-per-attachment (keyed by fileID) to content addressed blobs
+
+    Each legacy blob is hashed; the first copy of each content is kept, later copies are
+    deleted and their attachments pointed at the hash. Blobs are read one at a time so
+    memory use is bounded by the largest file. Reference counts are rebuilt in version 3.
+    '''
+    cursor.execute('''
+        SELECT id, fileID FROM filedata WHERE hash IS NULL
+        '''
+    )
+    legacy_rows = cursor.fetchall()
+    for row_id, file_id in legacy_rows:
+        cursor.execute('SELECT data FROM filedata WHERE id = ?', (row_id,))
+        data = cursor.fetchone()[0]
+        digest = hashlib.sha256(data if data is not None else b'').hexdigest()
+        cursor.execute('''
+            UPDATE attachments SET hash = ? WHERE id = ?
+            ''', (digest, file_id))
+        cursor.execute('SELECT 1 FROM filedata WHERE hash = ?', (digest,))
+        if cursor.fetchone() is not None:
+            cursor.execute('DELETE FROM filedata WHERE id = ?', (row_id,))
+        else:
+            cursor.execute('''
+                UPDATE filedata SET hash = ?, fileID = NULL WHERE id = ?
+                ''', (digest, row_id))
+    if len(legacy_rows) > 0:
+        logger.info('Deduplicated %d legacy blob(s)', len(legacy_rows))
+
+
+def add_indexes_and_foreign_keys(cursor):
+    '''
+    Version 3: indexes for the hot lookups, a cascading foreign key from attachments
+    to transactions, and triggers that keep blob reference counts in step with attachments
+
+    SQLite cannot add a foreign key to an existing table, so attachments is rebuilt.
+    Attachments whose transaction no longer exists are dropped on the way.
+    '''
+    cursor.execute('''
+        CREATE TABLE attachments_new (
+            id INTEGER PRIMARY KEY,
+            transaction_id INTEGER REFERENCES transactions (id) ON DELETE CASCADE,
+            name TEXT,
+            filepath TEXT,
+            hash TEXT
+            )'''
+    )
+    cursor.execute('''
+        INSERT INTO attachments_new (id, transaction_id, name, filepath, hash)
+        SELECT id, transaction_id, name, filepath, hash FROM attachments
+        WHERE transaction_id IN (SELECT id FROM transactions)
+        '''
+    )
+    cursor.execute('DROP TABLE attachments')
+    cursor.execute('ALTER TABLE attachments_new RENAME TO attachments')
+    cursor.execute('CREATE INDEX attachments_transaction_id ON attachments (transaction_id)')
+    cursor.execute('CREATE INDEX attachments_hash ON attachments (hash)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS filedata_fileID ON filedata (fileID)')
+    cursor.execute('''
+        CREATE TRIGGER attachments_blob_ref AFTER INSERT ON attachments
+        WHEN NEW.hash IS NOT NULL
+        BEGIN
+            UPDATE filedata SET refcount = refcount + 1 WHERE hash = NEW.hash;
+        END'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER attachments_blob_unref AFTER DELETE ON attachments
+        WHEN OLD.hash IS NOT NULL
+        BEGIN
+            UPDATE filedata SET refcount = refcount - 1 WHERE hash = OLD.hash;
+            DELETE FROM filedata WHERE hash = OLD.hash AND refcount <= 0;
+        END'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER attachments_blob_reref AFTER UPDATE OF hash ON attachments
+        BEGIN
+            UPDATE filedata SET refcount = refcount + 1 WHERE hash = NEW.hash;
+            UPDATE filedata SET refcount = refcount - 1 WHERE hash = OLD.hash;
+            DELETE FROM filedata WHERE hash = OLD.hash AND refcount <= 0;
+        END'''
+    )
+    cursor.execute('''
+        UPDATE filedata SET refcount = (
+            SELECT COUNT(*) FROM attachments WHERE attachments.hash = filedata.hash
+            )
+        WHERE hash IS NOT NULL
+        '''
+    )
+
+
+def add_full_text_search(cursor):
+    '''
+    Version 4: an FTS5 index over transaction names, notes and attachment names
+
+    transactions_fts has one row per transaction (rowid = transactions.id) and is
+    kept in sync by triggers on transactions and attachments.
+    '''
+    cursor.execute('''
+        CREATE VIRTUAL TABLE transactions_fts USING fts5 (
+            name, notes, attachment_names,
+            tokenize = 'unicode61 remove_diacritics 2'
+            )'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_fts_insert AFTER INSERT ON transactions
+        BEGIN
+            INSERT INTO transactions_fts (rowid, name, notes, attachment_names)
+            VALUES (NEW.id, NEW.name, NEW.notes, '');
+        END'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_fts_update AFTER UPDATE OF name, notes ON transactions
+        BEGIN
+            UPDATE transactions_fts SET name = NEW.name, notes = NEW.notes WHERE rowid = NEW.id;
+        END'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_fts_delete AFTER DELETE ON transactions
+        BEGIN
+            DELETE FROM transactions_fts WHERE rowid = OLD.id;
+        END'''
+    )
+    attachment_names = '''
+            UPDATE transactions_fts SET attachment_names = (
+                SELECT COALESCE(group_concat(name, ' '), '') FROM attachments WHERE transaction_id = {row}.transaction_id
+                )
+            WHERE rowid = {row}.transaction_id;'''
+    cursor.execute('''
+        CREATE TRIGGER attachments_fts_insert AFTER INSERT ON attachments
+        BEGIN{}
+        END'''.format(attachment_names.format(row='NEW'))
+    )
+    cursor.execute('''
+        CREATE TRIGGER attachments_fts_delete AFTER DELETE ON attachments
+        BEGIN{}
+        END'''.format(attachment_names.format(row='OLD'))
+    )
+    cursor.execute('''
+        CREATE TRIGGER attachments_fts_update AFTER UPDATE OF name, transaction_id ON attachments
+        BEGIN{}{}
+        END'''.format(attachment_names.format(row='OLD'), attachment_names.format(row='NEW'))
+    )
+    cursor.execute('''
+        INSERT INTO transactions_fts (rowid, name, notes, attachment_names)
+        SELECT id, name, notes, (
+            SELECT COALESCE(group_concat(attachments.name, ' '), '') FROM attachments
+            WHERE attachments.transaction_id = transactions.id
+            )
+        FROM transactions
+        '''
+    )
+
+
+def month_sql(row):
+    '''
+    SQL for the YYYY-MM month of a transactions row, whether its date was entered
+    as dd-mm-yyyy or yyyy-mm-dd
+
+    Parameters:
+        row (str) : the row to read, e.g. NEW, OLD or transactions
+    '''
+    return '''(CASE WHEN {row}.date GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+        THEN substr({row}.date, 7, 4) || '-' || substr({row}.date, 4, 2)
+        ELSE substr(COALESCE({row}.date, ''), 1, 7) END)'''.format(row=row)
+
+
+def iso_month_sql(row):
+    '''
+    SQL for the YYYY-MM month of a transactions row from its iso_date column (version 6 on)
+    '''
+    return "substr(COALESCE({row}.iso_date, ''), 1, 7)".format(row=row)
+
+
+def rebuild_monthly_summary(cursor, month_of=iso_month_sql):
+    '''
+    Recomputes monthly_summary from the transactions table
+    '''
+    cursor.execute('DELETE FROM monthly_summary')
+    cursor.execute('''
+        INSERT INTO monthly_summary (month, name, total, count)
+        SELECT {month}, COALESCE(name, ''), SUM(COALESCE(amount, 0) + 0), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 2
+        '''.format(month=month_of('transactions'))
+    )
+
+
+def _summary_add_sql(row, month_of):
+    return '''
+            INSERT INTO monthly_summary (month, name, total, count)
+            VALUES ({month}, COALESCE({row}.name, ''), COALESCE({row}.amount, 0) + 0, 1)
+            ON CONFLICT (month, name) DO UPDATE SET total = total + excluded.total, count = count + 1;'''.format(
+        month=month_of(row), row=row)
+
+
+def _summary_remove_sql(row, month_of):
+    return '''
+            UPDATE monthly_summary SET total = total - (COALESCE({row}.amount, 0) + 0), count = count - 1
+            WHERE month = {month} AND name = COALESCE({row}.name, '');
+            DELETE FROM monthly_summary
+            WHERE month = {month} AND name = COALESCE({row}.name, '') AND count <= 0;'''.format(
+        month=month_of(row), row=row)
+
+
+def add_monthly_summary(cursor):
+    '''
+    Version 5: per-month, per-person spending totals kept up to date by triggers
+
+    A year-by-person report reads at most twelve rows per person instead of
+    scanning every transaction.
+    '''
+    cursor.execute('''
+        CREATE TABLE monthly_summary (
+            month TEXT NOT NULL,
+            name TEXT NOT NULL,
+            total NUMBER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (month, name)
+            ) WITHOUT ROWID'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_insert AFTER INSERT ON transactions
+        BEGIN{}
+        END'''.format(_summary_add_sql('NEW', month_sql))
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_delete AFTER DELETE ON transactions
+        BEGIN{}
+        END'''.format(_summary_remove_sql('OLD', month_sql))
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_update AFTER UPDATE OF name, amount, date ON transactions
+        BEGIN{}{}
+        END'''.format(_summary_remove_sql('OLD', month_sql), _summary_add_sql('NEW', month_sql))
+    )
+    rebuild_monthly_summary(cursor, month_sql)
+
+
+def iso_date_sql(row):
+    '''
+    SQL converting a transactions row's date to YYYY-MM-DD when it is dd-mm-yyyy or
+    already yyyy-mm-dd, NULL otherwise
+
+    The result is kept only if it is a real date. date() with a modifier
+    normalises 31 February to 3 March and rejects month 13, so it differs from
+    the text for any day or month that does not exist.
+    '''
+    converted = '''(CASE
+        WHEN {row}.date GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+            THEN substr({row}.date, 7, 4) || '-' || substr({row}.date, 4, 2) || '-' || substr({row}.date, 1, 2)
+        WHEN {row}.date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+            THEN {row}.date
+        END)'''.format(row=row)
+    return "(CASE WHEN date({0}, '+0 days') = {0} THEN {0} END)".format(converted)
+
+
+def _create_iso_date_triggers(cursor):
+    cursor.execute('''
+        CREATE TRIGGER transactions_iso_date_insert AFTER INSERT ON transactions
+        WHEN NEW.iso_date IS NULL AND NEW.date IS NOT NULL
+        BEGIN
+            UPDATE transactions SET iso_date = {} WHERE id = NEW.id;
+        END'''.format(iso_date_sql('NEW'))
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_iso_date_update AFTER UPDATE OF date ON transactions
+        WHEN NEW.date IS NOT OLD.date AND NEW.iso_date IS OLD.iso_date
+        BEGIN
+            UPDATE transactions SET iso_date = {} WHERE id = NEW.id;
+        END'''.format(iso_date_sql('NEW'))
+    )
+
+
+def add_iso_dates(cursor, batch_size=1000):
+    '''
+    Version 6: an indexed iso_date (YYYY-MM-DD) column alongside the free text date
+
+    The programme writes iso_date itself; a trigger fills it in for rows written
+    without it (by older versions or by hand) when the date is in a format SQL can
+    convert. Existing rows are converted in SQL where possible and parsed in Python
+    otherwise. Monthly summaries are switched over to iso_date and rebuilt.
+    '''
+    _add_missing_columns(cursor, 'transactions', {'iso_date': 'TEXT'})
+    cursor.execute('UPDATE transactions SET iso_date = {}'.format(iso_date_sql('transactions')))
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, date FROM transactions
+            WHERE id > ? AND iso_date IS NULL AND COALESCE(date, '') != ''
+            ORDER BY id
+            LIMIT ?
+            ''', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if len(rows) == 0:
+            break
+        last_id = rows[-1][0]
+        cursor.executemany('UPDATE transactions SET iso_date = ? WHERE id = ?',
+                           [(dates.to_iso(date), row_id) for row_id, date in rows])
+    cursor.execute('CREATE INDEX transactions_iso_date ON transactions (iso_date)')
+    _create_iso_date_triggers(cursor)
+    # the summary follows iso_date, so rows whose iso_date is filled in by the
+    # triggers above move to the right month when it is
+    for trigger in ('insert', 'delete', 'update'):
+        cursor.execute('DROP TRIGGER transactions_summary_{}'.format(trigger))
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_insert AFTER INSERT ON transactions
+        BEGIN{}
+        END'''.format(_summary_add_sql('NEW', iso_month_sql))
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_delete AFTER DELETE ON transactions
+        BEGIN{}
+        END'''.format(_summary_remove_sql('OLD', iso_month_sql))
+    )
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_update AFTER UPDATE OF name, amount, iso_date ON transactions
+        BEGIN{}{}
+        END'''.format(_summary_remove_sql('OLD', iso_month_sql), _summary_add_sql('NEW', iso_month_sql))
+    )
+    rebuild_monthly_summary(cursor)
+
+
+def store_amounts_in_pence(cursor, batch_size=1000):
+    '''
+    Version 7: transactions.amount holds whole pence as an INTEGER instead of pounds
+
+    Numeric amounts are converted in SQL. Amounts stored as text (the GUI used to
+    save whatever was typed) are parsed in Python and set to NULL if they are not
+    an amount. Monthly summaries are rebuilt in pence afterwards.
+    '''
+    # the summary is rebuilt below, so skip updating it row by row
+    cursor.execute('DROP TRIGGER transactions_summary_update')
+    cursor.execute('''
+        UPDATE transactions SET amount = CAST(round(amount * 100) AS INTEGER)
+        WHERE typeof(amount) IN ('integer', 'real')
+        '''
+    )
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT id, amount FROM transactions
+            WHERE id > ? AND typeof(amount) NOT IN ('integer', 'real', 'null')
+            ORDER BY id
+            LIMIT ?
+            ''', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if len(rows) == 0:
+            break
+        last_id = rows[-1][0]
+        updates = []
+        for row_id, amount in rows:
+            try:
+                updates.append((money.to_pence(amount), row_id))
+            except ValueError:
+                logger.warning('Transaction %d has an invalid amount %r, clearing it', row_id, amount)
+                updates.append((None, row_id))
+        cursor.executemany('UPDATE transactions SET amount = ? WHERE id = ?', updates)
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_update AFTER UPDATE OF name, amount, iso_date ON transactions
+        BEGIN{}{}
+        END'''.format(_summary_remove_sql('OLD', iso_month_sql), _summary_add_sql('NEW', iso_month_sql))
+    )
+    rebuild_monthly_summary(cursor)
+
+
+def add_attachment_metadata(cursor, batch_size=1000):
+    '''
+    Version 8: attachments records the size, MIME type and time added of each file
+
+    Sizes are filled in with length(), which SQLite answers from the record header
+    without reading the blob. MIME types are sniffed from the first few bytes of each
+    blob through incremental blob I/O. created_at is left NULL for existing rows
+    because the time they were added was never recorded.
+    '''
+    _add_missing_columns(cursor, 'attachments', {'size': 'INTEGER', 'mime_type': 'TEXT', 'created_at': 'TEXT'})
+    cursor.execute('''
+        UPDATE attachments SET size = (
+            SELECT length(data) FROM filedata WHERE filedata.hash = attachments.hash
+            )
+        WHERE size IS NULL
+        '''
+    )
+    last_id = 0
+    while True:
+        cursor.execute('''
+            SELECT attachments.id, attachments.filepath, filedata.id FROM attachments
+            LEFT JOIN filedata ON filedata.hash = attachments.hash
+            WHERE attachments.id > ? AND attachments.mime_type IS NULL
+            ORDER BY attachments.id
+            LIMIT ?
+            ''', (last_id, batch_size))
+        rows = cursor.fetchall()
+        if len(rows) == 0:
+            break
+        last_id = rows[-1][0]
+        updates = []
+        for attachment_id, filepath, blob_id in rows:
+            head = b''
+            if blob_id is not None:
+                with cursor.connection.blobopen('filedata', 'data', blob_id, readonly=True) as blob:
+                    head = blob.read(filetypes.HEAD_SIZE)
+            updates.append((filetypes.guess_mime_type(filepath, head), attachment_id))
+        cursor.executemany('UPDATE attachments SET mime_type = ? WHERE id = ?', updates)
+
+
+def add_thumbnails(cursor):
+    '''
+    Version 9: a table of preview thumbnails, one per distinct file content
+
+    data is NULL for files a thumbnail could not be made of, so they are not tried
+    again. Thumbnails are deleted along with their blob.
+    '''
+    cursor.execute('''
+        CREATE TABLE thumbnails (
+            hash TEXT PRIMARY KEY,
+            data BLOB
+            ) WITHOUT ROWID'''
+    )
+    cursor.execute('''
+        CREATE TRIGGER filedata_thumbnail_delete AFTER DELETE ON filedata
+        WHEN OLD.hash IS NOT NULL
+        BEGIN
+            DELETE FROM thumbnails WHERE hash = OLD.hash;
+        END'''
+    )
+
+
+def add_blob_codecs(cursor):
+    '''
+    Version 10: filedata records the codec each blob is compressed with
+
+    Existing blobs were stored raw, which is what NULL means.
+    '''
+    _add_missing_columns(cursor, 'filedata', {'codec': 'TEXT'})
+
+
+def add_blob_store(cursor):
+    '''
+    Version 11: filedata.external marks blobs kept in the blob store directory instead of filedata.data
+
+    Existing blobs stay in the database; blobstore.py moves them between tiers.
+    '''
+    _add_missing_columns(cursor, 'filedata', {'external': 'INTEGER NOT NULL DEFAULT 0'})
+
+
+def reject_impossible_dates(cursor):
+    '''
+    Version 12: iso_date is NULL for dates that do not exist, such as 31-02-2023
+
+    Earlier versions only checked that the day and month were in range, so such
+    dates were stored, indexed and summed into months that do not exist. The
+    iso_date triggers are recreated with the checked conversion, stored values
+    that are not real dates are cleared and the monthly summary is rebuilt.
+    '''
+    cursor.execute('DROP TRIGGER IF EXISTS transactions_iso_date_insert')
+    cursor.execute('DROP TRIGGER IF EXISTS transactions_iso_date_update')
+    _create_iso_date_triggers(cursor)
+    # SQLite runs the newest trigger first, and the summary has to count a new row
+    # before its iso_date is filled in and moves it, so this one is recreated last
+    cursor.execute('DROP TRIGGER transactions_summary_insert')
+    cursor.execute('''
+        CREATE TRIGGER transactions_summary_insert AFTER INSERT ON transactions
+        BEGIN{}
+        END'''.format(_summary_add_sql('NEW', iso_month_sql))
+    )
+    cursor.execute('''
+        UPDATE transactions SET iso_date = NULL
+        WHERE iso_date IS NOT NULL AND date(iso_date, '+0 days') IS NOT iso_date
+        ''')
+    rebuild_monthly_summary(cursor)
+
+
+MIGRATIONS = [
+    create_base_tables,
+    deduplicate_filedata,
+    add_indexes_and_foreign_keys,
+    add_full_text_search,
+    add_monthly_summary,
+    add_iso_dates,
+    store_amounts_in_pence,
+    add_attachment_metadata,
+    add_thumbnails,
+    add_blob_codecs,
+    add_blob_store,
+    reject_impossible_dates,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(cursor):
+    cursor.execute('PRAGMA user_version')
+    return cursor.fetchone()[0]
+
+
+def initialise(cursor):
+    '''
+    Turns on incremental auto_vacuum if the database file is still empty
+
+    auto_vacuum can only be chosen before the first table is created, outside a
+    transaction, and only sticks once the file is written: VACUUM on an empty
+    file just writes its header. Older databases need a full VACUUM to switch
+    (see Database.enable_incremental_vacuum).
+
+    Parameters:
+        cursor (sqlite3.connection.cursor) : a cursor outside any transaction
+
+    Returns:
+        created (bool) : whether the file was empty
+    '''
+    cursor.execute('PRAGMA page_count')
+    if cursor.fetchone()[0] > 0:
+        return False
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    cursor.execute('VACUUM')
+    return True
+
+
+def _check_version(version):
+    if version > SCHEMA_VERSION:
+        raise RuntimeError('Database schema version {} is newer than this programme supports ({})'.format(version, SCHEMA_VERSION))
+
+
+def migrate(open_cursor):
+    '''
+    Upgrades the database schema to SCHEMA_VERSION
+
+    Every step runs in its own write transaction and user_version is read again
+    once that transaction holds the write lock. When several copies of the
+    programme open an old database at the same time, each step is applied by
+    whichever gets the lock first and skipped by the others.
+
+    Parameters:
+        open_cursor (callable) : open_cursor(write) returns a context manager giving a cursor;
+            with write=True the block is a write transaction, committed when it exits
+            without an error and rolled back otherwise, e.g. lambda write: Sql(db_path, write=write)
+
+    Returns:
+        version (int) : the schema version the database had before upgrading
+    '''
+    with open_cursor(False) as cursor:
+        version = get_version(cursor)
+    _check_version(version)
+    current = version
+    while current < SCHEMA_VERSION:
+        with open_cursor(True) as cursor:
+            current = get_version(cursor)
+            _check_version(current)
+            if current == SCHEMA_VERSION:
+                break
+            MIGRATIONS[current](cursor)
+            current += 1
+            cursor.execute('PRAGMA user_version = {}'.format(current))
+        logger.info('Migrated database schema to version %d', current)
+    return version
+
+
+# The statements the programme runs most often, with placeholder parameters.
+# check_query_plans fails any of them that would scan a whole table.
+HOT_QUERIES = {
+    'transactions page': ('SELECT id, name, amount, date, notes FROM transactions WHERE id > ? ORDER BY id LIMIT ?', (0, 50)),
+    'attachments for transaction': ('SELECT id, transaction_id, name, filepath, hash, size, mime_type, created_at FROM attachments WHERE transaction_id = ? ORDER BY id', (1,)),
+    'blob for attachment': ('SELECT filedata.id, filedata.codec, filedata.hash, filedata.external FROM attachments JOIN filedata ON filedata.hash = attachments.hash WHERE attachments.id = ?', (1,)),
+    'legacy blob for attachment': ('SELECT id, codec, hash, external FROM filedata WHERE fileID = ?', (1,)),
+    'blob by hash': ('SELECT 1 FROM filedata WHERE hash = ?', ('',)),
+    'thumbnail': ('SELECT data FROM thumbnails WHERE hash = ?', ('',)),
+    'blob store file in use': ('SELECT 1 FROM filedata WHERE hash = ? AND external = 1', ('',)),
+    'delete attachments for transaction': ('DELETE FROM attachments WHERE transaction_id = ?', (1,)),
+    'attachments using blob': ('SELECT COUNT(*) FROM attachments WHERE hash = ?', ('',)),
+    'monthly summary for a year': ('SELECT name, SUM(total), SUM(count) FROM monthly_summary WHERE month BETWEEN ? AND ? GROUP BY name', ('2023-01', '2023-12')),
+    'transactions in date range': ('SELECT id, name, amount, date, notes FROM transactions WHERE iso_date BETWEEN ? AND ? ORDER BY iso_date, id', ('2023-01-01', '2023-12-31')),
+    'orphaned blobs': ('SELECT id, hash FROM filedata WHERE hash > ? AND NOT EXISTS (SELECT 1 FROM attachments WHERE attachments.hash = filedata.hash) ORDER BY hash LIMIT ?', ('', 500)),
+}
+
+
+def check_query_plans(cursor, queries=None):
+    '''
+    Runs EXPLAIN QUERY PLAN on the hot queries and reports any that scan a table
+
+    Parameters:
+        cursor (sqlite3.connection.cursor) : a cursor on a migrated database
+        queries (dict[str, tuple]) : name -> (sql, parameters), HOT_QUERIES by default
+
+    Returns:
+        scans (dict[str, list[str]]) : name -> plan lines for every query that does a full scan
+    '''
+    scans = {}
+    for name, (query, parameters) in (queries or HOT_QUERIES).items():
+        cursor.execute('EXPLAIN QUERY PLAN ' + query, parameters)
+        details = [row[3] for row in cursor.fetchall()]
+        if any(detail.startswith('SCAN') for detail in details):
+            scans[name] = details
+    return scans
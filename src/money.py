@@ -0,0 +1,60 @@
+'''
+Money handling shared by the GUI, importer and database layer
+
+Amounts are stored in transactions.amount as whole pence (INTEGER) so that sums
+are exact and need no coercion. Transaction.amount holds pounds as a Decimal;
+Database converts at the boundary with to_pence and from_pence.
+'''
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+PENNY = Decimal('0.01')
+
+
+def to_pence(value):
+    '''
+    Converts an amount in pounds to whole pence
+
+    Accepts numbers or text such as "12.5", "£1,234.50", "-3" or "(12.00)".
+
+    Returns:
+        pence (int) : the amount in pence, or None if value is None or empty
+    '''
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        amount = value
+    elif isinstance(value, int):
+        return value * 100
+    elif isinstance(value, float):
+        amount = Decimal(repr(value))
+    else:
+        text = re.sub(r'[£$€,\s]', '', str(value))
+        if text == '':
+            return None
+        negative = text.startswith('(') and text.endswith(')')
+        try:
+            amount = Decimal(text.strip('()'))
+        except InvalidOperation:
+            raise ValueError('invalid amount {!r}'.format(value))
+        if negative:
+            amount = -amount
+    if not amount.is_finite():
+        raise ValueError('invalid amount {!r}'.format(value))
+    return int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_pence(pence):
+    '''
+    Converts whole pence to pounds
+
+    Returns:
+        amount (Decimal) : the amount in pounds with two decimal places, or None if pence is None
+    '''
+    if pence is None:
+        return None
+    try:
+        return (Decimal(pence) / 100).quantize(PENNY)
+    except (InvalidOperation, TypeError):
+        # written by something other than this programme
+        return None
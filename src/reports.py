@@ -0,0 +1,43 @@
+'''
+Prints spending reports from the expenses database
+
+Totals come from the monthly_summary table, which triggers keep up to date as
+transactions are added, changed and deleted, so a report reads a handful of rows
+however many transactions there are.
+
+Usage:
+    python reports.py --year 2023 [--by-month] [--db path/to/expenses.db]
+    python reports.py --rebuild
+'''
+import argparse
+from datetime import date
+
+from core import Database
+
+
+def format_rows(rows):
+    lines = []
+    for month, name, total, count in rows:
+        lines.append('{:<8} {:<30} {:>12.2f} {:>6}'.format(month or '', name or '(no name)', total or 0, count))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Spending reports from the expenses database')
+    parser.add_argument('--year', type=int, default=date.today().year)
+    parser.add_argument('--by-month', action='store_true', help='one line per month and person')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the summary table from all transactions')
+    parser.add_argument('--db', help='database file (defaults to the one in config.ini)')
+    args = parser.parse_args(argv)
+
+    Database.configure(args.db)
+    Database.prepare_tables()
+    if args.rebuild:
+        Database.rebuild_summaries()
+        print('Rebuilt monthly summaries')
+        return
+    print(format_rows(Database.get_year_summary(args.year, by_month=args.by_month)))
+
+
+if __name__ == '__main__':
+    main()
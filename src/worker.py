@@ -0,0 +1,202 @@
+'''
+Runs database and file work off the GUI thread
+
+A Worker owns one thread and runs the jobs submitted to it in order. When a job
+finishes its result (or exception) is posted back to the window with
+window.write_event_value, and the GUI thread hands it to the job's on_done or
+on_error callback from its event loop (see Worker.dispatch), so callbacks may
+update the window. Long jobs report progress and check for cancellation through
+Job.report; a cancelled job stops at its next report with JobCancelled, which
+rolls back the database transaction it was in.
+'''
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    '''
+    Raised inside a job, by Job.report or Job.check, after it has been cancelled
+    '''
+
+
+class Job:
+    """
+    A piece of work queued on a Worker
+
+    Attributes
+    ----------
+    description : str
+        what the job does, for the busy indicator
+
+    cancellable : bool
+        whether the GUI offers to cancel the job
+
+    cancelled : bool
+        whether cancel has been called
+
+    Methods
+    -------
+    cancel : None
+        asks the job to stop at its next report or check
+
+    check : None
+        raises JobCancelled if the job has been cancelled
+
+    report : None
+        posts progress to the window, at most every Worker.PROGRESS_INTERVAL seconds
+
+    """
+    def __init__(self, worker, func, args, kwargs, description, on_done, on_error, cancellable):
+        self.worker = worker
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.description = description
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancellable = cancellable
+        self._cancel = threading.Event()
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled(self.description)
+
+    def report(self, done, total, text=''):
+        '''
+        Posts progress to the window and stops the job if it has been cancelled
+
+        Called from the job itself, e.g. from an importer or attachment progress callback.
+
+        Parameters:
+            done (int) : the amount of work done so far
+            total (int) : the total amount of work, 0 if it is not known
+            text (str) : optional detail, e.g. the file being written
+        '''
+        self.check()
+        now = time.monotonic()
+        if (total == 0 or done < total) and now - self._last_report < Worker.PROGRESS_INTERVAL:
+            return
+        self._last_report = now
+        self.worker.window.write_event_value(Worker.PROGRESS_EVENT, (self, done, total, text))
+
+
+class Worker:
+    """
+    A thread that runs jobs for a PySimpleGUI window one at a time
+
+    Attributes
+    ----------
+    window : sg.Window
+        the window results and progress are posted to
+
+    current : Job
+        the job running now, or None
+
+    busy : bool
+        whether any submitted job has not been dispatched yet
+
+    Methods
+    -------
+    submit : Job
+        queues func(job, *args, **kwargs) to run on the worker thread
+
+    dispatch : None
+        called by the GUI thread with the value of an EVENT event, runs the job's callbacks
+
+    stop : None
+        cancels the running job, finishes the queue and waits for the thread
+
+    """
+    EVENT = '-WORKER-DONE-'
+    PROGRESS_EVENT = '-WORKER-PROGRESS-'
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, window, name='worker', on_error=None):
+        self.window = window
+        self.on_error = on_error
+        self.current = None
+        self._pending = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return self._pending > 0
+
+    def submit(self, func, *args, description='', on_done=None, on_error=None, cancellable=False, **kwargs):
+        '''
+        Queues a job; func is called on the worker thread as func(job, *args, **kwargs)
+
+        Parameters:
+            func (callable) : the work to do
+            description (str) : what the job does, for the busy indicator
+            on_done (callable) : optional, called on the GUI thread with the result
+            on_error (callable) : optional, called on the GUI thread with the exception (Worker.on_error by default)
+            cancellable (bool) : whether the GUI should offer to cancel the job
+
+        Returns:
+            job (Job) : the queued job
+        '''
+        job = Job(self, func, args, kwargs, description, on_done, on_error or self.on_error, cancellable)
+        self._pending += 1
+        self._queue.put(job)
+        return job
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self.current = job
+            result = error = None
+            try:
+                job.check()
+                result = job.func(job, *job.args, **job.kwargs)
+            except JobCancelled as cancelled:
+                error = cancelled
+            except Exception as exception:
+                logger.exception('%s failed', job.description or job.func)
+                error = exception
+            self.current = None
+            self.window.write_event_value(Worker.EVENT, (job, result, error))
+
+    @staticmethod
+    def dispatch(value):
+        '''
+        Runs the callbacks of a finished job; call from the GUI event loop for Worker.EVENT
+
+        Parameters:
+            value (tuple) : values[Worker.EVENT]
+        '''
+        job, result, error = value
+        job.worker._pending -= 1
+        if error is None:
+            if job.on_done is not None:
+                job.on_done(result)
+        elif isinstance(error, JobCancelled):
+            logger.info('Cancelled %s', job.description)
+        elif job.on_error is not None:
+            job.on_error(error)
+
+    def stop(self, timeout=10):
+        '''
+        Cancels the running job, lets the queued ones finish and waits for the thread to exit
+        '''
+        current = self.current
+        if current is not None and current.cancellable:
+            current.cancel()
+        self._queue.put(None)
+        self._thread.join(timeout)
@@ -0,0 +1,64 @@
+'''
+Builds databases in the schema the programme used before migrations were added
+
+The original programme created three tables with no user_version, stored
+amounts in pounds (or as whatever text was typed) and dates as dd-mm-yyyy,
+and kept a copy of every attachment's contents keyed by the attachment's id.
+'''
+import os
+import sqlite3
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+# (name, amount, date, notes) rows with a known outcome after migrating
+TRANSACTIONS = [
+    ('Alice', 12.5, '05-03-2023', 'lunch'),
+    ('Bob', '3.99', '17-03-2023', 'typed as text'),
+    ('Alice', 100, '01-04-2023', ''),
+    ('Carol', 'abc', '12-04-2023', 'not an amount'),
+    ('Bob', 7.25, '31-02-2023', 'a day that does not exist'),
+    ('Alice', 0.1, '', 'no date'),
+]
+
+# what each of TRANSACTIONS becomes: (amount in pence, iso_date)
+EXPECTED = [
+    (1250, '2023-03-05'),
+    (399, '2023-03-17'),
+    (10000, '2023-04-01'),
+    (None, '2023-04-12'),
+    (725, None),
+    (10, None),
+]
+
+RECEIPT = b'%PDF-1.4 the same receipt attached twice' + bytes(range(256)) * 8
+PHOTO = b'\x89PNG\r\n\x1a\n' + bytes(200)
+
+# (index into TRANSACTIONS, name, contents)
+ATTACHMENTS = [
+    (0, 'receipt.pdf', RECEIPT),
+    (1, 'receipt copy.pdf', RECEIPT),
+    (2, 'photo.png', PHOTO),
+]
+
+
+def create(path, extra_rows=0):
+    '''
+    Writes a baseline database holding TRANSACTIONS, ATTACHMENTS and extra_rows more transactions
+    '''
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE transactions (id INTEGER PRIMARY KEY, name TEXT, amount NUMBER, date TEXT, notes TEXT)')
+    conn.execute('CREATE TABLE attachments (id INTEGER PRIMARY KEY, transaction_id INTEGER, name TEXT, filepath TEXT)')
+    conn.execute('CREATE TABLE filedata (id INTEGER PRIMARY KEY, fileID INTEGER, data BLOB)')
+    conn.executemany('INSERT INTO transactions (name, amount, date, notes) VALUES (?, ?, ?, ?)', TRANSACTIONS)
+    conn.executemany('INSERT INTO transactions (name, amount, date, notes) VALUES (?, ?, ?, ?)',
+                     [('Shop {}'.format(i % 40), (i % 5000) / 100, '{:02d}-{:02d}-2022'.format(i % 28 + 1, i % 12 + 1), '')
+                      for i in range(extra_rows)])
+    for index, name, data in ATTACHMENTS:
+        cursor = conn.execute('INSERT INTO attachments (transaction_id, name, filepath) VALUES (?, ?, ?)',
+                              (index + 1, name, '/receipts/' + name))
+        conn.execute('INSERT INTO filedata (fileID, data) VALUES (?, ?)', (cursor.lastrowid, data))
+    conn.commit()
+    conn.close()
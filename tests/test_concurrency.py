@@ -0,0 +1,87 @@
+'''
+Several copies of the programme using one database file at the same time
+'''
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import baseline
+import migrations
+from core import Database, Sql
+
+OPEN = '''
+import sys
+from core import Database
+Database.db_path = sys.argv[1]
+Database.JOURNAL_MODE = sys.argv[2]
+Database.prepare_tables()
+'''
+
+WRITE = OPEN + '''
+from core import Transaction
+for i in range(int(sys.argv[3])):
+    transaction = Transaction()
+    transaction.name = sys.argv[4]
+    transaction.amount = 1
+    transaction.date = '01-01-2024'
+    transaction.notes = ''
+    Database.add_transaction(transaction)
+'''
+
+
+def run_together(script, *argument_lists):
+    '''
+    Starts one process per argument list running script, waits for them all and returns their results
+    '''
+    processes = [subprocess.Popen([sys.executable, '-c', script] + [str(argument) for argument in arguments],
+                                  cwd=baseline.SRC, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 for arguments in argument_lists]
+    return [(process.wait(timeout=300), process.stderr.read()) for process in processes]
+
+
+class TestConcurrentAccess(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.scratch, 'shared.db')
+        Database.db_path = self.db_path
+
+    def tearDown(self):
+        Sql.close_all()
+        shutil.rmtree(self.scratch)
+
+    def check_upgraded(self, results):
+        for status, errors in results:
+            self.assertEqual(status, 0, errors)
+        with Sql(self.db_path) as cursor:
+            cursor.execute('PRAGMA user_version')
+            self.assertEqual(cursor.fetchone()[0], migrations.SCHEMA_VERSION)
+            cursor.execute('SELECT amount, iso_date FROM transactions ORDER BY id LIMIT ?', (len(baseline.EXPECTED),))
+            self.assertEqual(cursor.fetchall(), baseline.EXPECTED)
+            cursor.execute('PRAGMA integrity_check')
+            self.assertEqual(cursor.fetchone()[0], 'ok')
+
+    def test_open_old_database_together(self):
+        # each step is applied once, by whichever process takes the write lock first
+        baseline.create(self.db_path, extra_rows=20000)
+        self.check_upgraded(run_together(OPEN, *[(self.db_path, 'wal')] * 3))
+
+    def test_open_old_database_together_rollback_journal(self):
+        baseline.create(self.db_path, extra_rows=20000)
+        self.check_upgraded(run_together(OPEN, *[(self.db_path, 'delete')] * 3))
+
+    def test_writers_in_several_processes(self):
+        results = run_together(WRITE, *[(self.db_path, 'wal', 100, 'writer{}'.format(number)) for number in range(3)])
+        for status, errors in results:
+            self.assertEqual(status, 0, errors)
+        with Sql(self.db_path) as cursor:
+            cursor.execute('SELECT name, COUNT(*) FROM transactions GROUP BY name ORDER BY name')
+            self.assertEqual(cursor.fetchall(), [('writer0', 100), ('writer1', 100), ('writer2', 100)])
+            cursor.execute('SELECT SUM(count) FROM monthly_summary')
+            self.assertEqual(cursor.fetchone()[0], 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+'''
+Upgrades a baseline database through every migration and checks the result
+'''
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import baseline
+import migrations
+from core import Database, Sql
+
+
+class MigrationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        Database.db_path = os.path.join(self.scratch, 'expenses.db')
+        Database.JOURNAL_MODE = 'wal'
+
+    def tearDown(self):
+        Sql.close_all()
+        shutil.rmtree(self.scratch)
+
+    def query(self, statement, parameters=()):
+        with Sql(Database.db_path) as cursor:
+            cursor.execute(statement, parameters)
+            return cursor.fetchall()
+
+
+class TestUpgradeBaseline(MigrationTestCase):
+    def setUp(self):
+        super().setUp()
+        baseline.create(Database.db_path)
+        Database.prepare_tables()
+
+    def test_schema_version(self):
+        self.assertEqual(self.query('PRAGMA user_version'), [(migrations.SCHEMA_VERSION,)])
+
+    def test_amounts_in_pence_and_iso_dates(self):
+        rows = self.query('SELECT amount, iso_date FROM transactions ORDER BY id')
+        self.assertEqual(rows, baseline.EXPECTED)
+
+    def test_blobs_deduplicated_with_refcounts(self):
+        self.assertEqual(self.query('SELECT COUNT(*) FROM filedata'), [(2,)])
+        self.assertEqual(self.query('SELECT COUNT(*) FROM filedata WHERE fileID IS NOT NULL'), [(0,)])
+        refcounts = dict(self.query('SELECT hash, refcount FROM filedata'))
+        self.assertEqual(refcounts, {hashlib.sha256(baseline.RECEIPT).hexdigest(): 2,
+                                     hashlib.sha256(baseline.PHOTO).hexdigest(): 1})
+        mismatched = self.query('''
+            SELECT COUNT(*) FROM filedata
+            WHERE refcount != (SELECT COUNT(*) FROM attachments WHERE attachments.hash = filedata.hash)
+            ''')
+        self.assertEqual(mismatched, [(0,)])
+
+    def test_attachment_contents_and_metadata(self):
+        rows = self.query('SELECT id, name, size, mime_type FROM attachments ORDER BY id')
+        for (row_id, name, size, mime_type), (_, _, data) in zip(rows, baseline.ATTACHMENTS):
+            self.assertEqual(Database.get_data_for_file(row_id), data, name)
+            self.assertEqual(size, len(data), name)
+        self.assertEqual([row[3] for row in rows], ['application/pdf', 'application/pdf', 'image/png'])
+
+    def test_monthly_summary_matches_transactions(self):
+        summary = self.query('SELECT month, name, total, count FROM monthly_summary ORDER BY month, name')
+        expected = self.query('''
+            SELECT substr(COALESCE(iso_date, ''), 1, 7), COALESCE(name, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+            FROM transactions GROUP BY 1, 2 ORDER BY 1, 2
+            ''')
+        self.assertEqual(summary, expected)
+        self.assertIn(('2023-03', 'Alice', 1250, 1), summary)
+
+    def test_summary_follows_later_writes(self):
+        Database.delete_transaction(1)
+        self.query("UPDATE transactions SET date = '20-03-2023' WHERE id = 3")
+        summary = self.query('SELECT month, name, total, count FROM monthly_summary ORDER BY month, name')
+        expected = self.query('''
+            SELECT substr(COALESCE(iso_date, ''), 1, 7), COALESCE(name, ''), SUM(COALESCE(amount, 0)), COUNT(*)
+            FROM transactions GROUP BY 1, 2 ORDER BY 1, 2
+            ''')
+        self.assertEqual(summary, expected)
+
+    def test_hot_queries_use_indexes(self):
+        self.assertEqual(Database.check_query_plans(), {})
+
+    def test_upgrading_again_changes_nothing(self):
+        before = self.query('SELECT * FROM transactions ORDER BY id')
+        Sql.close_all()
+        Database.prepare_tables()
+        self.assertEqual(self.query('SELECT * FROM transactions ORDER BY id'), before)
+
+
+class TestNewDatabase(MigrationTestCase):
+    def test_created_at_current_version(self):
+        Database.prepare_tables()
+        self.assertEqual(self.query('PRAGMA user_version'), [(migrations.SCHEMA_VERSION,)])
+        self.assertEqual(self.query('PRAGMA auto_vacuum'), [(2,)])
+        self.assertEqual(self.query('PRAGMA journal_mode'), [('wal',)])
+        self.assertEqual(Database.check_query_plans(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()